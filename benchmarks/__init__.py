@@ -0,0 +1,6 @@
+'''
+Microbenchmarks for the engine hot paths, with results kept per commit.
+
+python -m benchmarks run
+python -m benchmarks compare [base] [head]
+'''
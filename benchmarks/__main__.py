@@ -0,0 +1,86 @@
+'''
+python -m benchmarks run [-k filter] [--no-save]
+python -m benchmarks compare [base] [head] [--threshold 0.1]
+'''
+
+import argparse
+import json
+import sys
+
+from benchmarks.harness import RESULTS_PATH, run_benchmarks, current_commit, load_results, save_results
+from benchmarks.harness import compare_results, format_report
+
+# registers the benchmarks
+import benchmarks.hot_paths
+import benchmarks.rounds
+import benchmarks.keypad
+import benchmarks.serial
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(prog='benchmarks',
+                                   description='Engine microbenchmarks, stored per commit')
+
+  parser.add_argument('-r', '--results',
+                      help='the json file results are stored in',
+                      type=str,
+                      default=RESULTS_PATH)
+
+  subparsers = parser.add_subparsers(dest='command', required=True)
+
+  run_parser = subparsers.add_parser('run', help='run the benchmarks and store the results under the current commit')
+  run_parser.add_argument('-k', '--filter',
+                          help='only run benchmarks whose name contains this',
+                          type=str,
+                          default=None)
+  run_parser.add_argument('--min_sample_time',
+                          help='the least number of seconds a sample takes',
+                          type=float,
+                          default=0.02)
+  run_parser.add_argument('--samples',
+                          help='the number of samples per benchmark',
+                          type=int,
+                          default=7)
+  run_parser.add_argument('--no-save',
+                          help='only print the results',
+                          dest='save',
+                          action='store_false')
+
+  compare_parser = subparsers.add_parser('compare', help='compare the results of two commits')
+  compare_parser.add_argument('base',
+                              help='the commit to compare against (defaults to the second newest run)',
+                              nargs='?',
+                              default=None)
+  compare_parser.add_argument('head',
+                              help='the commit to compare (defaults to the newest run)',
+                              nargs='?',
+                              default=None)
+  compare_parser.add_argument('-t', '--threshold',
+                              help='slowdown that counts as a regression',
+                              type=float,
+                              default=0.1)
+
+  args = parser.parse_args()
+
+  if args.command == 'run':
+    commit = current_commit()
+    print(f'Running benchmarks on {commit}')
+    results = run_benchmarks(args.filter, args.min_sample_time, args.samples)
+    if args.save:
+      save_results(results, commit, args.results)
+      print(f'Saved to {args.results}')
+
+  elif args.command == 'compare':
+    all_results = load_results(args.results)
+    commits = list(all_results)
+    base = args.base if args.base is not None else (commits[-2] if len(commits) >= 2 else None)
+    head = args.head if args.head is not None else (commits[-1] if commits else None)
+    if base not in all_results or head not in all_results:
+      print(f'Need results for both commits, have {json.dumps(commits)}')
+      sys.exit(1)
+
+    rows = compare_results(all_results[base], all_results[head])
+    print(format_report(base, head, rows, args.threshold))
+    # lets ci fail on a regression
+    if any(ratio > 1 + args.threshold for _, _, _, ratio in rows):
+      sys.exit(2)
@@ -0,0 +1,160 @@
+'''
+Registers, times and stores benchmarks.
+
+A benchmark is a function that does its setup and returns the function to time, along
+with how many operations one call of it does, so every result is in nanoseconds per operation.
+Results are stored in a json file keyed by commit (git describe --always --dirty).
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from typing import Callable, Iterable, Optional
+import datetime
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+BenchmarkSetup = Callable[..., tuple[Callable[[], None], int]]
+
+RESULTS_PATH = os.path.join(os.path.dirname(__file__), 'results.json')
+
+
+class Benchmark:
+  def __init__(self, name: str, setup: BenchmarkSetup, params: dict):
+    self.name = name
+    self.setup = setup
+    self.params = params
+
+  # e.g. display_state.to_json[hand=30,discard=90]
+  @property
+  def full_name(self) -> str:
+    if not self.params:
+      return self.name
+    return self.name + '[' + ','.join(f'{key}={value}' for key, value in self.params.items()) + ']'
+
+  def run(self, min_sample_time: float = 0.02, num_samples: int = 7) -> dict:
+    fn, ops_per_call = self.setup(**self.params)
+
+    # like timeit, keep doubling the calls per sample until a sample is long enough to time
+    number = 1
+    while _time_calls(fn, number) < min_sample_time:
+      number *= 2
+
+    samples = [_time_calls(fn, number) * 1e9 / (number * ops_per_call) for _ in range(num_samples)]
+    return {
+      'median_ns': statistics.median(samples),
+      'min_ns': min(samples),
+      'stdev_ns': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+      'calls_per_sample': number,
+      'ops_per_call': ops_per_call,
+    }
+
+
+BENCHMARKS: list[Benchmark] = []
+
+# registers the decorated setup once per combination of params
+def benchmark(name: str, **param_values: Iterable) -> Callable[[BenchmarkSetup], BenchmarkSetup]:
+  def register(setup: BenchmarkSetup) -> BenchmarkSetup:
+    combinations = [{}]
+    for key, values in param_values.items():
+      combinations = [{**combination, key: value} for combination in combinations for value in values]
+    BENCHMARKS.extend(Benchmark(name, setup, params) for params in combinations)
+    return setup
+  return register
+
+def _time_calls(fn: Callable[[], None], number: int) -> float:
+  # the collector kicking in mid sample is most of the noise between runs
+  gc_was_enabled = gc.isenabled()
+  gc.disable()
+  try:
+    start = time.perf_counter()
+    for _ in range(number):
+      fn()
+    return time.perf_counter() - start
+  finally:
+    if gc_was_enabled:
+      gc.enable()
+
+
+############################ Results ############################
+
+def current_commit() -> str:
+  try:
+    return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, check=True,
+                          cwd=os.path.dirname(__file__)).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return 'unknown'
+
+def run_benchmarks(name_filter: Optional[str] = None, min_sample_time: float = 0.02, num_samples: int = 7,
+                   verbose: bool = True) -> dict[str, dict]:
+  results = {}
+  for bench in BENCHMARKS:
+    if name_filter is not None and name_filter not in bench.full_name:
+      continue
+    try:
+      results[bench.full_name] = bench.run(min_sample_time, num_samples)
+    except ImportError as e:
+      # e.g. pyserial on a machine that never talks to the board
+      print(f'{bench.full_name:<50} skipped, {e}')
+      continue
+    if verbose:
+      print(f'{bench.full_name:<50} {_format_ns(results[bench.full_name]["median_ns"]):>12}/op')
+  return results
+
+def load_results(path: str = RESULTS_PATH) -> dict[str, dict]:
+  if not os.path.exists(path):
+    return {}
+  with open(path) as f:
+    return json.load(f)
+
+# stores results under commit, rerunning a commit replaces its results and makes it the newest
+def save_results(results: dict[str, dict], commit: str, path: str = RESULTS_PATH) -> None:
+  all_results = load_results(path)
+  all_results.pop(commit, None)
+  all_results[commit] = {
+    'date': datetime.datetime.now().isoformat(timespec='seconds'),
+    'python': platform.python_version(),
+    'machine': platform.machine(),
+    'benchmarks': results,
+  }
+  with open(path, 'w') as f:
+    json.dump(all_results, f, indent=2)
+
+
+############################ Comparing ############################
+
+# a row of (name, base ns/op, head ns/op, head / base) for every benchmark in both runs
+def compare_results(base: dict, head: dict) -> list[tuple[str, float, float, float]]:
+  rows = []
+  for name, head_result in head['benchmarks'].items():
+    if name in base['benchmarks']:
+      base_ns, head_ns = base['benchmarks'][name]['median_ns'], head_result['median_ns']
+      rows.append((name, base_ns, head_ns, head_ns / base_ns))
+  return rows
+
+def format_report(base_commit: str, head_commit: str, rows: list[tuple[str, float, float, float]], threshold: float = 0.1) -> str:
+  lines = [f'{"benchmark":<50} {base_commit:>12} {head_commit:>12}   change']
+  num_regressions = 0
+  for name, base_ns, head_ns, ratio in rows:
+    if ratio > 1 + threshold:
+      mark = '  REGRESSION'
+      num_regressions += 1
+    elif ratio < 1 / (1 + threshold):
+      mark = '  faster'
+    else:
+      mark = ''
+    lines.append(f'{name:<50} {_format_ns(base_ns):>12} {_format_ns(head_ns):>12} {(ratio - 1) * 100:>+7.1f}%{mark}')
+  lines.append(f'{num_regressions} regression{"s" if num_regressions != 1 else ""} over {threshold * 100:.0f}%')
+  return '\n'.join(lines)
+
+def _format_ns(ns: float) -> str:
+  if ns >= 1e6:
+    return f'{ns / 1e6:.2f} ms'
+  if ns >= 1e3:
+    return f'{ns / 1e3:.2f} us'
+  return f'{ns:.1f} ns'
@@ -0,0 +1,168 @@
+'''
+Benchmarks of the single operations the game does over and over.
+
+Most of them are run with small and late game sized hands and discard piles, since
+slowdowns tend to only show up once those have grown.
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from queue import Queue
+
+from benchmarks.harness import benchmark
+from uno.card import Color, CARDS
+from uno.card import Number, PlusTwo, Skip, Reverse, Wild, PlusFour
+from uno.deck import Deck
+from uno.event_log import NullQueue
+from uno.hand import Hand
+from uno.uno import UNO, DisplayUNOState
+
+HAND_SIZES = [7, 30]
+DISCARD_SIZES = [1, 90]
+COLORS = [Color.RED, Color.YELLOW, Color.GREEN, Color.BLUE]
+
+
+# a game in the middle of a round, every player holding hand_size cards
+def make_state(hand_size: int, discard_size: int, num_players: int = 4, seed: int = 0) -> UNO:
+  deck = Deck(num_players * hand_size + discard_size, seed=seed)
+  state = UNO(Queue(), NullQueue())
+  state.load_state({
+    'hand_size': 7,
+    'num_players': num_players,
+    'end_score': 500,
+    'discard_pile': [card for card in deck.deal(discard_size) if card.color is not None] or [Number(Color.RED, 5)],
+    'color': Color.RED,
+    'turn': 0,
+    'dir': 1,
+    'call_uno_player': None,
+    'uno_fail_player': None,
+    'players': [(deck.deal(hand_size), None, None, 0) for _ in range(num_players)],
+  })
+  return state
+
+
+############################ Deck ############################
+
+# shuffling a fresh deck is what replaced generating random cards
+@benchmark('deck.new', num_cards=[Deck.TOTAL_CARDS])
+def bench_deck_new(num_cards: int):
+  return lambda: Deck(num_cards), 1
+
+@benchmark('deck.pop')
+def bench_deck_pop():
+  deck = Deck(Deck.TOTAL_CARDS, seed=0)
+  cards = deck.cards.copy()
+
+  def run():
+    deck.cards[:] = cards
+    for _ in range(Deck.TOTAL_CARDS):
+      deck.pop()
+  return run, Deck.TOTAL_CARDS
+
+@benchmark('deck.deal', num_cards=[7])
+def bench_deck_deal(num_cards: int):
+  deck = Deck(Deck.TOTAL_CARDS, seed=0)
+  cards = deck.cards.copy()
+
+  def run():
+    deck.cards[:] = cards
+    for _ in range(Deck.TOTAL_CARDS // num_cards):
+      deck.deal(num_cards)
+  return run, Deck.TOTAL_CARDS // num_cards
+
+@benchmark('deck.reshuffle', discard=[10, 90])
+def bench_deck_reshuffle(discard: int):
+  deck, discard_pile = Deck(0, seed=0), Deck(discard, seed=0)
+  cards = discard_pile.cards.copy()
+
+  def run():
+    deck.cards.clear()
+    discard_pile.cards[:] = cards
+    deck.reshuffle(discard_pile)
+  return run, 1
+
+
+############################ Player ############################
+
+@benchmark('player.receive_card', hand=HAND_SIZES, discard=DISCARD_SIZES)
+def bench_receive_card(hand: int, discard: int):
+  state = make_state(hand, discard)
+  player = state.players[0]
+  start_hand = list(player.hand)
+  new_cards = Deck(10, seed=1).cards
+
+  def run():
+    player.hand = Hand(start_hand)
+    for card in new_cards:
+      player.receive_card(card, state)
+  return run, len(new_cards)
+
+@benchmark('player.remove_card', hand=HAND_SIZES, discard=DISCARD_SIZES)
+def bench_remove_card(hand: int, discard: int):
+  state = make_state(hand, discard)
+  player = state.players[0]
+  start_hand = list(player.hand)
+  removed_cards = start_hand[::2]
+
+  def run():
+    player.hand = Hand(start_hand)
+    for card in removed_cards:
+      player.remove_card(card, state)
+  return run, len(removed_cards)
+
+@benchmark('player.get_playable_cards', hand=HAND_SIZES)
+def bench_get_playable_cards(hand: int):
+  state = make_state(hand, 1)
+  player = state.players[0]
+  top_cards = [card for card in CARDS if card.color is not None]
+
+  def run():
+    for top_card in top_cards:
+      player.get_playable_cards(top_card, top_card.color)
+  return run, len(top_cards)
+
+
+############################ Cards ############################
+
+CARD_OF_TYPE = {card.type.__name__: card for card in [Number(Color.RED, 5), PlusTwo(Color.RED), Skip(Color.RED),
+                                                     Reverse(Color.RED), Wild(), PlusFour()]}
+
+# every card kind on top, with every deck color
+@benchmark('card.is_playable', card_type=list(CARD_OF_TYPE))
+def bench_is_playable(card_type: str):
+  card = CARD_OF_TYPE[card_type]
+  pairs = [(top_card, color) for top_card in CARDS for color in COLORS]
+
+  def run():
+    for top_card, color in pairs:
+      card.is_playable(top_card, color)
+  return run, len(pairs)
+
+
+############################ Display state ############################
+
+@benchmark('display_state.new', hand=HAND_SIZES, discard=DISCARD_SIZES)
+def bench_display_state_new(hand: int, discard: int):
+  state = make_state(hand, discard)
+  player = state.players[0]
+  cards = list(player.hand)
+
+  # a player changes between every state, like it does in the game
+  def run():
+    player.hand = Hand(cards)
+    DisplayUNOState(state)
+  return run, 1
+
+@benchmark('display_state.to_json', hand=HAND_SIZES, discard=DISCARD_SIZES)
+def bench_display_state_to_json(hand: int, discard: int):
+  display_state = DisplayUNOState(make_state(hand, discard))
+  return display_state.to_json, 1
+
+
+############################ Scoring ############################
+
+@benchmark('uno.update_score', hand=HAND_SIZES)
+def bench_update_score(hand: int):
+  state = make_state(hand, 1)
+  return lambda: state.update_score(state.players[0]), 1
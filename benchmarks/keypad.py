@@ -0,0 +1,46 @@
+'''
+Benchmarks of the keypad on the simulated gpio backend, so they run on any machine.
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from benchmarks.harness import benchmark
+from uno.keypad import Keypad, SimulatedGpioBackend
+
+
+# a press going from the backend through the keypad thread to whoever is reading
+@benchmark('keypad.press_to_read')
+def bench_press_to_read():
+  backend = SimulatedGpioBackend()
+  # every edge counts, so presses can follow each other as fast as we make them
+  keypad = Keypad(backend, debounce=0)
+
+  def run():
+    backend.press(1, 2)
+    keypad.read()
+    backend.release(1, 2)
+  return run, 1
+
+# filtering a press and release that each bounce a few times
+@benchmark('keypad.handle_edge', bounces=[0, 4])
+def bench_handle_edge(bounces: int):
+  keypad = Keypad(SimulatedGpioBackend())
+  backend = keypad.backend
+  backend.down.add((1, 2))
+
+  edges = []
+  timestamp = 0.0
+  for is_rising in [True, False]:
+    for _ in range(bounces):
+      edges += [(1, is_rising, timestamp), (1, not is_rising, timestamp + 0.001)]
+      timestamp += 0.002
+    edges.append((1, is_rising, timestamp))
+    timestamp += 0.1
+
+  def run():
+    keypad._last_edge.clear()
+    for row, is_rising, edge_time in edges:
+      keypad.handle_edge(row, is_rising, edge_time)
+    keypad.presses.get_nowait()
+  return run, len(edges)
@@ -0,0 +1,96 @@
+'''
+Benchmarks of whole rounds, on the headless engine and on the real UNO state.
+
+Every call plays the same seeded round, so the work done doesn't change between runs.
+Bigger hands make for longer rounds with large discard piles and reshuffles.
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from collections import deque
+import random
+
+from benchmarks.harness import benchmark
+from uno.card import Color
+from uno.deck import Deck
+from uno.engine import RandomPolicy, new_game, step
+from uno.requests import *
+from uno.uno import UNO
+
+
+# collects what the state sends out, in order
+class ListQueue(deque):
+  def put(self, request: Request) -> None:
+    self.append(request)
+
+
+# runs one round of UNO on the calling thread, dealing from a seeded deck and playing random legal moves
+class SimulatedTable:
+  def __init__(self, num_players: int, hand_size: int, seed: int = 0):
+    self.num_players = num_players
+    self.hand_size = hand_size
+    self.seed = seed
+
+  def play_round(self) -> int:
+    rng = random.Random(self.seed)
+    deck = Deck(Deck.TOTAL_CARDS, seed=self.seed)
+    output_queue = ListQueue()
+    state = UNO(ListQueue(), output_queue)
+    state.handle_request(Reset(self.num_players, self.hand_size))
+
+    num_requests = 0
+    while output_queue:
+      request = output_queue.popleft()
+      num_requests += 1
+
+      if type(request) is DealCard:
+        num_recycled = 0
+        if not deck.cards:
+          recyclable = request.recyclable()
+          deck.recycle(recyclable)
+          num_recycled = len(recyclable)
+        # every card is in someone's hand
+        if not deck.cards:
+          deck = Deck(Deck.TOTAL_CARDS, seed=rng.getrandbits(32))
+        state.handle_request(DealtCard(deck.pop(), request.player, num_recycled))
+      elif type(request) is GetUserInput:
+        state.handle_request(self._choose(rng, state, request))
+      elif type(request) in [RoundOver, GameOver]:
+        break
+    return num_requests
+
+  def _choose(self, rng: random.Random, state: UNO, request: GetUserInput) -> Request:
+    request_types = request.request_types
+    if SetColor in request_types:
+      return SetColor(Color(rng.randrange(Color.NUM_COLORS)))
+    elif Bluff in request_types:
+      return Bluff(rng.random() < 0.25)
+    elif UNOFail in request_types and rng.random() < 0.5:
+      return UNOFail()
+
+    player = state.players[state.turn]
+    if request.for_drawn_card:
+      card = player.drawn_card
+    else:
+      playable_cards = player.get_playable_cards(state.discard_pile.peek(), state.color)
+      if not playable_cards:
+        return SkipTurn()
+      card = rng.choice(playable_cards)
+
+    request_type = CallUNO if CallUNO in request_types else PlayCard
+    return request_type(card, for_drawn_card=request.for_drawn_card)
+
+
+@benchmark('round.engine', players=[4], hand=[7, 20])
+def bench_engine_round(players: int, hand: int):
+  def run():
+    policy = RandomPolicy(0)
+    state, decision = new_game(Reset(players, hand), seed=0)
+    while type(decision) not in [RoundOver, GameOver]:
+      state, decision = step(state, policy(state), in_place=True)
+  return run, 1
+
+@benchmark('round.uno', players=[4], hand=[7, 20])
+def bench_uno_round(players: int, hand: int):
+  return SimulatedTable(players, hand).play_round, 1
@@ -0,0 +1,28 @@
+'''
+Benchmarks of the serial transport against the motor driver emulator, with the board's
+delays turned off so only the transport is timed.
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from benchmarks.harness import benchmark
+from uno.motor_emulator import MotorDriverEmulator
+from uno.serial_transport import SerialTransport
+
+
+# one command at a time, the way the controller used to wait on every answer
+@benchmark('serial.request')
+def bench_request():
+  transport = SerialTransport(MotorDriverEmulator(time_scale=0).start().port)
+  return lambda: transport.request('u'), 1
+
+# many commands in flight before waiting on any of them
+@benchmark('serial.pipelined', in_flight=[8])
+def bench_pipelined(in_flight: int):
+  transport = SerialTransport(MotorDriverEmulator(time_scale=0).start().port)
+
+  def run():
+    for future in [transport.send('r100') for _ in range(in_flight)]:
+      future.result()
+  return run, in_flight
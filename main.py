@@ -5,7 +5,9 @@ import datetime
 import time
 
 from uno.uno import UNO
-from uno.manager import Manager
+from uno.manager import Manager, AsyncManager
+from uno.tables import TableRegistry
+from uno.profiling import SamplingProfiler
 from uno import NAME_TO_CONTROLLER, NAME_TO_DISPLAYER
 
 def print_example_usage():
@@ -45,12 +47,78 @@ if __name__ == '__main__':
                       type=str,
                       default='http://172.26.72.28:5000')
   
+  parser.add_argument('--update_window',
+                      help='seconds of display updates to merge into one (0 sends every update right away)',
+                      type=float,
+                      default=0.016)
+  
+  parser.add_argument('--event_log',
+                      help='directory to write a replayable event log of every game to',
+                      type=str,
+                      default=None)
+  
+  parser.add_argument('-s', '--seed',
+                      help='seed for shuffling the deck',
+                      type=int,
+                      default=None)
+  
+  parser.add_argument('--script',
+                      help='file of terminal commands to play the game with, runs the game deterministically with ScriptedController (one file per table)',
+                      type=str,
+                      nargs='+',
+                      default=None)
+  
+  parser.add_argument('-t', '--tables',
+                      help='the number of tables to host in this process, each one is its own game',
+                      type=int,
+                      default=1)
+  
+  parser.add_argument('--async',
+                      help='run the state and displayers on one event loop',
+                      dest='use_async',
+                      action='store_true',
+                      default=False)
+  
+  parser.add_argument('--profile',
+                      help='profile the session and write flame graph stacks to PROFILE.wall.folded and PROFILE.cpu.folded',
+                      type=str,
+                      default=None)
+  
+  parser.add_argument('--profile_delay',
+                      help='seconds to wait before profiling starts',
+                      type=float,
+                      default=0)
+  
+  parser.add_argument('--profile_duration',
+                      help='seconds to profile for (defaults to the whole session)',
+                      type=float,
+                      default=None)
+  
+  parser.add_argument('--profile_interval',
+                      help='seconds between profile samples',
+                      type=float,
+                      default=0.01)
+  
   args = parser.parse_args()
 
+  # a script replaces the player, and every state goes out so nothing depends on timing
+  if args.script is not None:
+    args.controller_name = 'ScriptedController'
+    args.update_window = 0
+
   # get the classes the user wants to use
   controller_class = NAME_TO_CONTROLLER[args.controller_name]
   displayer_classes = [NAME_TO_DISPLAYER[displayer_name] for displayer_name in args.displayer_names]
 
+  # every table gets its own controller, so it can't be one that needs the only stdin or the only dealer
+  if args.tables > 1 and controller_class.single_instance:
+    parser.error(f'{args.controller_name} can only run one table, use ScriptedController (--script) for more')
+  if controller_class.__name__ == 'ScriptedController' and args.script is None:
+    parser.error('ScriptedController needs --script')
+  if args.script is not None and len(args.script) != args.tables:
+    parser.error(f'--script needs one file per table, got {len(args.script)} for {args.tables} table(s)')
+  scripts = args.script if args.script is not None else [None] * args.tables
+
   # set up logging
   logger: logging.Logger = logging.Logger(__file__)
   date_time = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
@@ -65,6 +133,25 @@ if __name__ == '__main__':
   else:
     logger.addHandler(logging.NullHandler())
 
+  profiler = None
+  if args.profile is not None:
+    profiler = SamplingProfiler(args.profile, args.profile_interval, args.profile_delay, args.profile_duration)
+    profiler.start()
+
   # create the objects from the classes
-  manager = Manager(controller_class, displayer_classes, logger, args.url)
-  manager.start()
\ No newline at end of file
+  try:
+    if args.tables > 1:
+      registry = TableRegistry(logger, args.url, args.update_window or None, args.event_log)
+      for table_id in range(args.tables):
+        registry.add_table(controller_class, displayer_classes,
+                           args.seed + table_id if args.seed is not None else None, scripts[table_id])
+      registry.start()
+    else:
+      manager_class = AsyncManager if args.use_async else Manager
+      manager = manager_class(controller_class, displayer_classes, logger, args.url, args.update_window or None, args.event_log,
+                              args.seed, scripts[0])
+      manager.start()
+  finally:
+    # the session ends with ctrl-c, write whatever was profiled
+    if profiler is not None:
+      profiler.stop()
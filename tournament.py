@@ -0,0 +1,173 @@
+'''
+Runs self-play games with the headless engine on every core and aggregates the results.
+
+python tournament.py -n 100000 --seed 0
+'''
+
+import argparse
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional
+
+from uno.engine import EngineState, RandomPolicy, new_game, step
+from uno.requests import Reset, RoundOver, GameOver
+
+
+class TournamentStats:
+  def __init__(self, num_players: int):
+    self.num_players = num_players
+    self.num_games = 0
+    self.num_rounds = 0
+    self.num_turns = 0
+    self.game_wins = [0] * num_players
+    self.round_wins = [0] * num_players
+    self.round_scores: Counter[int] = Counter()
+
+    # +4 outcomes, keyed by (bluff called, player had other options)
+    self.bluffs: Counter[tuple[bool, bool]] = Counter()
+
+  def record_round(self, winner: int, score: int, num_turns: int) -> None:
+    self.num_rounds += 1
+    self.num_turns += num_turns
+    self.round_wins[winner] += 1
+    self.round_scores[score] += 1
+
+  def record_game(self, winner: int) -> None:
+    self.num_games += 1
+    self.game_wins[winner] += 1
+
+  def record_bluff(self, called: bool, guilty: bool) -> None:
+    self.bluffs[(called, guilty)] += 1
+
+  # merging is order independent, so results can be folded in as workers finish
+  def merge(self, other: 'TournamentStats') -> None:
+    self.num_games += other.num_games
+    self.num_rounds += other.num_rounds
+    self.num_turns += other.num_turns
+    self.game_wins = [a + b for a, b in zip(self.game_wins, other.game_wins)]
+    self.round_wins = [a + b for a, b in zip(self.round_wins, other.round_wins)]
+    self.round_scores.update(other.round_scores)
+    self.bluffs.update(other.bluffs)
+
+  def to_json(self) -> dict:
+    num_plus_fours = sum(self.bluffs.values())
+    obj = {
+      'games': self.num_games,
+      'rounds': self.num_rounds,
+      'win_rate_by_seat': [wins / max(self.num_games, 1) for wins in self.game_wins],
+      'round_win_rate_by_seat': [wins / max(self.num_rounds, 1) for wins in self.round_wins],
+      'average_round_turns': self.num_turns / max(self.num_rounds, 1),
+      'average_round_score': sum(score * count for score, count in self.round_scores.items()) / max(self.num_rounds, 1),
+      'round_scores': {str(score): count for score, count in sorted(self.round_scores.items())},
+      'plus_fours': num_plus_fours,
+      'bluffs': {
+        'not_called': self.bluffs[(False, False)] + self.bluffs[(False, True)],
+        'uncaught_bluff': self.bluffs[(False, True)],
+        'caught_bluff': self.bluffs[(True, True)],
+        'failed_call': self.bluffs[(True, False)],
+      },
+    }
+    return obj
+
+
+# each game gets its own seed so results don't depend on how games are split across workers
+def game_seed(seed: int, game: int) -> int:
+  return seed * 1_000_003 + game
+
+def play_games(first_game: int, num_games: int, seed: int, request: Reset, call_bluff_rate: float) -> TournamentStats:
+  stats = TournamentStats(request.num_players)
+  for game in range(first_game, first_game + num_games):
+    policy = RandomPolicy(game_seed(seed, game), call_bluff_rate=call_bluff_rate)
+    state, decision = new_game(request, game_seed(seed, game))
+
+    while (action := policy(state)) is not None:
+      if state.phase == EngineState.BLUFF:
+        stats.record_bluff(action.is_bluff, state.has_other_options)
+
+      state, decision = step(state, action, in_place=True)
+
+      if type(decision) in [RoundOver, GameOver]:
+        # find who went out this round, the GameOver winner may be someone else
+        round_winner = next(pos for pos, hand in enumerate(state.hands) if not hand)
+        stats.record_round(round_winner, state.round_score(round_winner), state.num_turns)
+      if type(decision) is GameOver:
+        stats.record_game(decision.winning_player.position)
+  return stats
+
+def run_tournament(num_games: int, request: Reset, seed: int = 0, num_workers: Optional[int] = None, call_bluff_rate: float = 0.25) -> TournamentStats:
+  num_workers = num_workers or os.cpu_count() or 1
+
+  stats = TournamentStats(request.num_players)
+  if num_games <= 0:
+    return stats
+
+  # a few chunks per worker keeps every core busy until the end
+  num_chunks = min(num_games, num_workers * 4)
+  bounds = [num_games * i // num_chunks for i in range(num_chunks + 1)]
+
+  with ProcessPoolExecutor(max_workers=num_workers) as executor:
+    futures = [executor.submit(play_games, start, end - start, seed, request, call_bluff_rate) for start, end in zip(bounds, bounds[1:])]
+    for future in as_completed(futures):
+      stats.merge(future.result())
+  return stats
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(prog='tournament',
+                                   description='Self-play UNO tournament on every core')
+
+  parser.add_argument('-n', '--num_games',
+                      help='the number of games to play',
+                      type=int,
+                      default=10000)
+
+  parser.add_argument('-s', '--seed',
+                      help='the base seed, every game derives its own seed from it',
+                      type=int,
+                      default=0)
+
+  parser.add_argument('-w', '--workers',
+                      help='the number of worker processes (defaults to one per core)',
+                      type=int,
+                      default=None)
+
+  parser.add_argument('-p', '--num_players',
+                      type=int,
+                      default=4)
+
+  parser.add_argument('--hand_size',
+                      type=int,
+                      default=7)
+
+  parser.add_argument('--end_score',
+                      type=int,
+                      default=500)
+
+  parser.add_argument('--call_bluff_rate',
+                      help='how often players call a bluff on a +4',
+                      type=float,
+                      default=0.25)
+
+  parser.add_argument('-o', '--output',
+                      help='write the results as json to this path',
+                      type=str,
+                      default=None)
+
+  args = parser.parse_args()
+
+  start = time.perf_counter()
+  stats = run_tournament(args.num_games, Reset(args.num_players, args.hand_size, args.end_score), args.seed, args.workers, args.call_bluff_rate)
+  elapsed = time.perf_counter() - start
+
+  results = stats.to_json()
+  results['seconds'] = elapsed
+
+  if args.output is not None:
+    with open(args.output, 'w') as f:
+      json.dump(results, f, indent=2)
+
+  del results['round_scores']
+  print(json.dumps(results, indent=2))
@@ -1,30 +1,72 @@
-from inspect import isclass
 from pkgutil import iter_modules
 from pathlib import Path
 from importlib import import_module
-from typing import Dict, List, Type
-from uno.controller import Controller
-from uno.displayer import Displayer
+from typing import Dict, Iterator, List, Mapping, Type
+import ast
 
-CONTROLLERS: List[Type[Controller]] = []
-DISPLAYERS: List[Type[Displayer]] = []
+# only import what we need if we are doing type checking
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+  from uno.controller import Controller
+  from uno.displayer import Displayer
+
+
+# maps class names to the modules that define them, and only imports a module once one of its classes is asked for
+class LazyRegistry(Mapping[str, type]):
+  def __init__(self, class_modules: Dict[str, str]):
+    self.class_modules = class_modules
+    self._classes: Dict[str, type] = {}
+
+  def __getitem__(self, name: str) -> type:
+    if name not in self._classes:
+      module = import_module(self.class_modules[name])
+      self._classes[name] = getattr(module, name)
+    return self._classes[name]
+
+  def __iter__(self) -> Iterator[str]:
+    return iter(self.class_modules)
+
+  def __len__(self) -> int:
+    return len(self.class_modules)
+
+
+# finds every class in the package that derives from one of base_names, by reading the source instead of importing it
+def _scan_subclasses(package_dir: Path, base_names: List[str]) -> Dict[str, Dict[str, str]]:
+  class_modules: Dict[str, str] = {}
+  class_bases: Dict[str, List[str]] = {}
+  for (_, module_name, _) in iter_modules([str(package_dir)]):
+    path = package_dir / f'{module_name}.py'
+    if not path.exists():
+      continue
+    source = path.read_text()
+    # parsing is most of the cost, skip modules that can't define one
+    if not any(base_name in source for base_name in base_names):
+      continue
+    for node in ast.parse(source, str(path)).body:
+      if isinstance(node, ast.ClassDef):
+        class_modules[node.name] = f'{__name__}.{module_name}'
+        # uno.controller.Controller and Controller are both just Controller
+        class_bases[node.name] = [base.attr if isinstance(base, ast.Attribute) else getattr(base, 'id', None) for base in node.bases]
+
+  def derives_from(name: str, base_name: str) -> bool:
+    return name == base_name or any(base is not None and base in class_bases and derives_from(base, base_name)
+                                    for base in class_bases.get(name, []))
+
+  return {base_name: {name: module for name, module in class_modules.items() if derives_from(name, base_name)}
+          for base_name in base_names}
 
 
-# adapted from https://julienharbulot.com/python-dynamical-import.html
-# iterate through the modules in the current package
 package_dir = Path(__file__).resolve().parent
-for (_, module_name, _) in iter_modules([str(package_dir)]):
-    
-    # import the module and iterate through its attributes
-    module = import_module(f"{__name__}.{module_name}")
-    for attribute_name in dir(module):
-        attribute = getattr(module, attribute_name)
-
-        if isclass(attribute):
-            if issubclass(attribute, Controller):
-              CONTROLLERS.append(attribute)
-            elif issubclass(attribute, Displayer):
-              DISPLAYERS.append(attribute)
-        
-NAME_TO_CONTROLLER: Dict[str, Type[Controller]] = {controller.__name__: controller for controller in CONTROLLERS}
-NAME_TO_DISPLAYER: Dict[str, Type[Displayer]] = {Displayer.__name__: Displayer for Displayer in DISPLAYERS}
\ No newline at end of file
+_subclasses = _scan_subclasses(package_dir, ['Controller', 'Displayer'])
+
+NAME_TO_CONTROLLER: Mapping[str, Type['Controller']] = LazyRegistry(_subclasses['Controller'])
+NAME_TO_DISPLAYER: Mapping[str, Type['Displayer']] = LazyRegistry(_subclasses['Displayer'])
+
+
+# the full lists import every controller and displayer module, so they are only built if someone asks for them
+def __getattr__(name: str):
+  if name == 'CONTROLLERS':
+    return [NAME_TO_CONTROLLER[controller_name] for controller_name in NAME_TO_CONTROLLER]
+  if name == 'DISPLAYERS':
+    return [NAME_TO_DISPLAYER[displayer_name] for displayer_name in NAME_TO_DISPLAYER]
+  raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
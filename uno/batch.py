@@ -0,0 +1,282 @@
+'''
+Vectorized batch simulator that plays many games of UNO in lockstep.
+
+Each game is stored as rows of NumPy arrays instead of Card objects:
+ * hands: (games, players, kinds) count of each card kind held by each player
+ * draw / discard: (games, kinds) count of each card kind left in the piles
+ * top, color, turn, dir: (games,) vectors
+
+Every step advances all unfinished games by one turn with a random policy. The
+card semantics come from uno/card.py (the playability table is built by calling
+is_playable on every pair of card kinds) and the card counts from uno/deck.py.
+
+Simplifications compared to uno/uno.py: nobody forgets to call UNO, a drawn card is
+always played when it can be, and a wild color is the color the player holds the most of.
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from typing import Optional
+import numpy as np
+
+from uno.card import Color, CARDS, NUM_CARD_KINDS
+from uno.card import Number, PlusTwo, Skip, Reverse, PlusFour, Wild
+from uno.deck import Deck
+
+############################ Card kind tables ############################
+
+COLORS = [Color.RED, Color.YELLOW, Color.GREEN, Color.BLUE]
+
+# card kinds are indexed by card_id
+KINDS = CARDS
+NUM_KINDS = NUM_CARD_KINDS
+
+# type codes for vectorized effects
+NUMBER, PLUSTWO, SKIP, REVERSE, WILD, PLUSFOUR = range(6)
+_TYPE_CODES = {Number: NUMBER, PlusTwo: PLUSTWO, Skip: SKIP, Reverse: REVERSE, Wild: WILD, PlusFour: PLUSFOUR}
+
+KIND_TYPE = np.array([_TYPE_CODES[card.type] for card in KINDS])
+KIND_COLOR = np.array([card.color if card.color is not None else -1 for card in KINDS])
+KIND_VALUE = np.array([card.get_value() for card in KINDS])
+
+# number of physical copies of each kind in a deck
+KIND_COPIES = np.bincount([card.card_id for card in Deck.full_deck()], minlength=NUM_KINDS)
+assert KIND_COPIES.sum() == Deck.TOTAL_CARDS
+
+# PLAYABLE[top kind, deck color, kind] is whether kind can be played on top of top kind
+PLAYABLE = np.array([[[bool(card.is_playable(top_card, color)) for card in KINDS] for color in COLORS] for top_card in KINDS])
+
+# COLOR_ONEHOT[kind, color] for counting the colors in a hand
+COLOR_ONEHOT = np.array([[card.color == color for color in COLORS] for card in KINDS], dtype=np.int16)
+
+# OTHER_OPTIONS[color, kind] is whether holding kind makes a +4 a bluff, same check as PlusFour.play_card
+OTHER_OPTIONS = np.array([[card.type == Wild or card.color == color for card in KINDS] for color in COLORS])
+
+
+class RoundResults:
+  def __init__(self, winner: np.ndarray, score: np.ndarray, num_turns: np.ndarray):
+    # winner is -1 for rounds that hit the turn limit
+    self.winner = winner
+    self.score = score
+    self.num_turns = num_turns
+
+  def __repr__(self) -> str:
+    return f'RoundResults[games={len(self.winner)}, mean_score={self.score.mean():.1f}, mean_turns={self.num_turns.mean():.1f}]'
+
+class GameResults:
+  def __init__(self, winner: np.ndarray, scores: np.ndarray, num_rounds: np.ndarray):
+    self.winner = winner
+    self.scores = scores
+    self.num_rounds = num_rounds
+
+  def __repr__(self) -> str:
+    return f'GameResults[games={len(self.winner)}, mean_rounds={self.num_rounds.mean():.2f}]'
+
+
+class BatchSimulator:
+  def __init__(self, num_games: int, num_players: int = 4, hand_size: int = 7, seed: Optional[int] = None,
+               call_bluff_rate: float = 0.25, max_turns: int = 1000):
+    self.num_games = num_games
+    self.num_players = num_players
+    self.hand_size = hand_size
+    self.call_bluff_rate = call_bluff_rate
+    self.max_turns = max_turns
+    self.rng = np.random.default_rng(seed)
+    self._games = np.arange(num_games)
+
+    self.hands = np.zeros((num_games, num_players, NUM_KINDS), dtype=np.int16)
+    self.draw = np.zeros((num_games, NUM_KINDS), dtype=np.int16)
+    self.discard = np.zeros((num_games, NUM_KINDS), dtype=np.int16)
+    self.top = np.zeros(num_games, dtype=np.int64)
+    self.color = np.zeros(num_games, dtype=np.int64)
+    self.turn = np.zeros(num_games, dtype=np.int64)
+    self.dir = np.ones(num_games, dtype=np.int64)
+    self.num_turns = np.zeros(num_games, dtype=np.int64)
+    self.winner = np.full(num_games, -1, dtype=np.int64)
+    self.active = np.zeros(num_games, dtype=bool)
+
+  # deals a new round in every game
+  def reset(self) -> None:
+    self.hands[:] = 0
+    self.draw[:] = KIND_COPIES
+    self.discard[:] = 0
+    self.turn[:] = 0
+    self.dir[:] = 1
+    self.num_turns[:] = 0
+    self.winner[:] = -1
+    self.active[:] = True
+
+    games = self._games
+    for pos in range(self.num_players):
+      for _ in range(self.hand_size):
+        self._deal(games, np.full(self.num_games, pos))
+
+    # get the initial card, wild cards stay on the table under it
+    top = self._draw(games)
+    while (wild := KIND_TYPE[top] >= WILD).any():
+      self.discard[games[wild], top[wild]] += 1
+      top[wild] = self._draw(games[wild])
+    self.top[:] = top
+    self.color[:] = KIND_COLOR[top]
+
+    # the first card takes effect as if player 0 played it
+    self._apply(games, top, np.zeros(self.num_games, dtype=np.int64))
+
+  # advances every active game by one turn
+  def step(self) -> None:
+    games = np.flatnonzero(self.active)
+    if len(games) == 0:
+      return
+
+    players = self.turn[games]
+    hands = self.hands[games, players]
+    playable = PLAYABLE[self.top[games], self.color[games]]
+    weights = hands * playable
+
+    # pick a random playable card, weighted by how many copies are held
+    chosen = self._sample(weights)
+
+    # players without a playable card draw one and play it if they can
+    stuck = chosen < 0
+    if stuck.any():
+      stuck_games = games[stuck]
+      drawn = self._deal(stuck_games, players[stuck])
+      can_play = drawn >= 0
+      can_play[can_play] = playable[np.flatnonzero(stuck)[can_play], drawn[can_play]]
+      chosen[stuck] = np.where(can_play, drawn, -1)
+
+    # players that still can't play just pass
+    passed = chosen < 0
+    if passed.any():
+      pass_games = games[passed]
+      self.turn[pass_games] = (self.turn[pass_games] + self.dir[pass_games]) % self.num_players
+
+    played = ~passed
+    if played.any():
+      play_games = games[played]
+      kinds = chosen[played]
+      play_players = players[played]
+      prev_colors = self.color[play_games]
+
+      # move the card from the hand to the discard pile
+      self.hands[play_games, play_players, kinds] -= 1
+      self.discard[play_games, self.top[play_games]] += 1
+      self.top[play_games] = kinds
+      self.color[play_games] = KIND_COLOR[kinds]
+      self._apply(play_games, kinds, play_players, prev_colors)
+
+      # the player that just played is the only one who can have run out of cards
+      won = self.hands[play_games, play_players].sum(1) == 0
+      if won.any():
+        won_games = play_games[won]
+        self.winner[won_games] = play_players[won]
+        self.active[won_games] = False
+
+    self.num_turns[games] += 1
+    self.active[games[self.num_turns[games] >= self.max_turns]] = False
+
+  # plays one round in every game
+  def run_round(self) -> RoundResults:
+    self.reset()
+    while self.active.any():
+      self.step()
+
+    score = (self.hands * KIND_VALUE).sum(axis=(1, 2))
+    score[self.winner < 0] = 0
+    return RoundResults(self.winner.copy(), score, self.num_turns.copy())
+
+  # plays rounds until someone in every game has reached end_score
+  def run_games(self, end_score: int = 500, max_rounds: int = 100) -> GameResults:
+    scores = np.zeros((self.num_games, self.num_players), dtype=np.int64)
+    num_rounds = np.zeros(self.num_games, dtype=np.int64)
+    winner = np.full(self.num_games, -1, dtype=np.int64)
+    playing = np.ones(self.num_games, dtype=bool)
+
+    for _ in range(max_rounds):
+      results = self.run_round()
+      counted = playing & (results.winner >= 0)
+      scores[self._games[counted], results.winner[counted]] += results.score[counted]
+      num_rounds[playing] += 1
+
+      # same as UNO.get_game_winner, the first player over the score wins
+      over = scores >= end_score
+      finished = playing & over.any(1)
+      winner[finished] = over[finished].argmax(1)
+      playing &= ~finished
+      if not playing.any():
+        break
+
+    return GameResults(winner, scores, num_rounds)
+
+  # applies the effect of the played kinds and moves the turn on
+  def _apply(self, games: np.ndarray, kinds: np.ndarray, players: np.ndarray, prev_colors: Optional[np.ndarray] = None) -> None:
+    types = KIND_TYPE[kinds]
+    n = self.num_players
+
+    # wild cards take the color the player holds the most of
+    is_wild = types >= WILD
+    if is_wild.any():
+      color_counts = self.hands[games[is_wild], players[is_wild]] @ COLOR_ONEHOT
+      self.color[games[is_wild]] = color_counts.argmax(1)
+
+    reverse = types == REVERSE
+    self.dir[games[reverse]] *= -1
+    dirs = self.dir[games]
+    victims = (players + dirs) % n
+
+    draw_count = np.zeros(len(games), dtype=np.int64)
+    draw_to = victims.copy()
+    next_turn = victims.copy()
+
+    plus_two = types == PLUSTWO
+    draw_count[plus_two] = 2
+    next_turn[plus_two | (types == SKIP)] = (victims[plus_two | (types == SKIP)] + dirs[plus_two | (types == SKIP)]) % n
+
+    plus_four = np.flatnonzero(types == PLUSFOUR)
+    if len(plus_four):
+      four_games = games[plus_four]
+      hands = self.hands[four_games, players[plus_four]]
+      guilty = ((hands * OTHER_OPTIONS[prev_colors[plus_four]])[:, KIND_TYPE != PLUSFOUR] > 0).any(1)
+      called = self.rng.random(len(plus_four)) < self.call_bluff_rate
+
+      # caught bluffing, the player who put it down draws and the victim plays next
+      caught = called & guilty
+      draw_count[plus_four] = np.where(called & ~guilty, 6, 4)
+      draw_to[plus_four[caught]] = players[plus_four[caught]]
+      next_turn[plus_four] = np.where(caught, victims[plus_four], (victims[plus_four] + dirs[plus_four]) % n)
+
+    for k in range(draw_count.max(initial=0)):
+      drawing = draw_count > k
+      self._deal(games[drawing], draw_to[drawing])
+
+    self.turn[games] = next_turn
+
+  # deals one card to each (game, player) pair, returns the dealt kinds
+  def _deal(self, games: np.ndarray, players: np.ndarray) -> np.ndarray:
+    kinds = self._draw(games)
+    dealt = kinds >= 0
+    self.hands[games[dealt], players[dealt], kinds[dealt]] += 1
+    return kinds
+
+  # draws one card from each game's draw pile, reshuffling the discard pile when it runs out
+  def _draw(self, games: np.ndarray) -> np.ndarray:
+    empty = self.draw[games].sum(1) == 0
+    if empty.any():
+      empty_games = games[empty]
+      self.draw[empty_games] += self.discard[empty_games]
+      self.discard[empty_games] = 0
+
+    kinds = self._sample(self.draw[games])
+    drawn = kinds >= 0
+    self.draw[games[drawn], kinds[drawn]] -= 1
+    return kinds
+
+  # samples one kind per row with probability proportional to the counts, -1 for empty rows
+  def _sample(self, counts: np.ndarray) -> np.ndarray:
+    cumulative = counts.cumsum(1)
+    totals = cumulative[:, -1]
+    picks = (self.rng.random(len(counts)) * totals).astype(np.int64)
+    kinds = (cumulative > picks[:, None]).argmax(1)
+    kinds[totals == 0] = -1
+    return kinds
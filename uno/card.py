@@ -1,7 +1,7 @@
 # enables lazy type annotation resolving
 from __future__ import annotations
 
-from typing import Optional, Collection
+from typing import Optional, Collection, Generator
 from enum import IntEnum
 
 # only import what we need if we are doing type checking
@@ -13,9 +13,8 @@ if TYPE_CHECKING:
 from uno.requests import *
 
 '''
-what if the play_card is spawned on a thread and a channel is given to it 
-to listen on... then we can have the main thread redirect only the requests that matter
-can also send quit requests to the card so that it returns 
+play_card either finishes right away or, when the card needs something from the
+controller, is a generator that UNO's main loop resumes with each reply (see UNO.transaction_sync)
 '''
 
 class Color(IntEnum):
@@ -26,20 +25,52 @@ class Color(IntEnum):
   NUM_COLORS = 4
 
 class Card:
-  def __init__(self, color: Optional[Color], number: Optional[int]):
-    self.color: Color = color
-    self.number = number
-    self.type = type(self)
-    
+  __slots__ = ('color', 'number', 'type', 'image_name', 'card_id', 'bit', 'sort_key')
+
+  # every card kind that has been created, keyed by (type, color, number)
+  _interned: dict[tuple, Card] = {}
+
+  # cards are interned, so constructing the same card twice gives back the same object
+  def __new__(cls, color: Optional[Color] = None, number: Optional[int] = None):
+    key = (cls, color, number)
+    if (card := Card._interned.get(key)) is not None:
+      return card
+
+    card = super().__new__(cls)
+    card.color = Color(color) if color is not None else None
+    card.number = int(number) if number is not None else None
+    card.type = cls
+
     # ensure that we've created a valid card
-    # if not self._validate():
+    # if not card._validate():
     #   raise ValueError('Invalid card')
-    
+
     # get the path to the image
-    if self.type in [PlusFour, Wild]:
-      self.image_name = f'{self.type.__name__.lower()}.png'
+    if card.type in [PlusFour, Wild]:
+      card.image_name = f'{card.type.__name__.lower()}.png'
     else:
-      self.image_name = f'{self.color.name.lower() if self.color is not None else "yellow"}_{self.number if self.type == Number else self.type.__name__.lower()}.png'
+      card.image_name = f'{card.color.name.lower() if card.color is not None else "yellow"}_{card.number if card.type == Number else card.type.__name__.lower()}.png'
+
+    # the order hands are sorted in: card color, then card type, then card number
+    card.sort_key = (card.color if card.color is not None else -1,
+                     card.type.__name__,
+                     card.number if card.number is not None else -1)
+
+    # the kinds in CARDS get ids 0-53, anything else (like a misclassified card) comes after
+    card.card_id = len(Card._interned)
+    card.bit = 1 << card.card_id
+    Card._interned[key] = card
+    return card
+
+  # copies of interned cards are the card itself
+  def __copy__(self) -> Card:
+    return self
+
+  def __deepcopy__(self, memo) -> Card:
+    return self
+
+  def __reduce__(self):
+    return (self.type, (self.color, self.number))
 
   def to_json(self):
     obj = {
@@ -62,7 +93,7 @@ class Card:
       return False
     
   # this is just here so any instance of a Card has this method 
-  def play_card(self, state: UNO) -> None:
+  def play_card(self, state: UNO) -> Optional[Generator[None, Request, None]]:
     pass 
 
   # this is just here so any instance of a Card has this method 
@@ -73,12 +104,6 @@ class Card:
   def get_value(self):
     pass
   
-  def __eq__(self, other) -> bool:
-    return isinstance(other, Card) \
-           and self.type == other.type \
-           and self.color == other.color \
-           and self.number == other.number 
-  
   def __repr__(self) -> str:
     res = ''
     res += f'{self.color.name} ' if self.color is not None else ''
@@ -87,6 +112,8 @@ class Card:
     return res.rstrip()
   
 class Number(Card):
+  __slots__ = ()
+
   def is_playable(self, top_card: Card, deck_color: Color) -> bool:
     return self.color == deck_color or (top_card.type == Number and top_card.number == self.number)
   
@@ -105,8 +132,7 @@ class Number(Card):
     
 
 class PlusTwo(Card):
-  def __init__(self, color: Optional[Color]):
-    super().__init__(color=color, number=None)
+  __slots__ = ()
 
   # NOTE: this function will never be called in the case where the control flow
   # doesn't let a player play the card... these functions are unaware of the rest
@@ -114,7 +140,7 @@ class PlusTwo(Card):
   def is_playable(self, top_card: Card, deck_color: Color) -> bool:
     return self.color == deck_color or top_card.type == PlusTwo
   
-  def play_card(self, state: UNO) -> None:
+  def play_card(self, state: UNO) -> Generator[None, Request, None]:
     # place the card on the discard pile
     state.discard_pile.push(self)
 
@@ -127,9 +153,9 @@ class PlusTwo(Card):
 
     # deal two cards to the player
     curr_player: Player = state.players[state.turn]
-    if (received_request := state.transaction_sync(DealCard(curr_player))) is None: return
+    received_request = yield from state.transaction_sync(DealCard(curr_player, state.discard_pile))
     curr_player.receive_card(received_request.card, state)
-    if (received_request := state.transaction_sync(DealCard(curr_player))) is None: return
+    received_request = yield from state.transaction_sync(DealCard(curr_player, state.discard_pile))
     curr_player.receive_card(received_request.card, state)
 
     # go to the next player
@@ -139,8 +165,7 @@ class PlusTwo(Card):
     return 20
 
 class Skip(Card):
-  def __init__(self, color: Optional[Color]):
-    super().__init__(color=color, number=None)
+  __slots__ = ()
 
   def is_playable(self, top_card: Card, deck_color: Color) -> bool:
     return self.color == deck_color or top_card.type == Skip
@@ -161,8 +186,7 @@ class Skip(Card):
     return 20
 
 class Reverse(Card):
-  def __init__(self, color: Optional[Color]):
-    super().__init__(color=color, number=None)
+  __slots__ = ()
 
   def is_playable(self, top_card: Card, deck_color: Color) -> bool:
     return self.color == deck_color or top_card.type == Reverse
@@ -183,21 +207,15 @@ class Reverse(Card):
     return 20
 
 class PlusFour(Card):
-  def __init__(self):
-    super().__init__(color=None, number=None)
+  __slots__ = ()
 
   def is_playable(self, top_card: Card, deck_color: Color) -> bool:
     return True
   
-  def play_card(self, state: UNO) -> None:
+  def play_card(self, state: UNO) -> Generator[None, Request, None]:
     # check to see if we had other options than playing this card
     player: Player = state.players[state.turn]
-    playable_cards: Collection[Card] = player.get_playable_cards(state.discard_pile.peek(), state.color)
-
-    # check if we have any cards that meet these conditions
-    # 1. is not a plus 4
-    # 2. matches the color of the top card or is a wild card
-    has_other_options: bool = any(map(lambda c: c.type != PlusFour and (c.type == Wild or c.color == state.color), playable_cards))
+    has_other_options: bool = player.has_other_options(state.discard_pile.peek(), state.color)
 
     # place the card on the discard pile
     state.discard_pile.push(self)
@@ -205,7 +223,7 @@ class PlusFour(Card):
     state._send_update_to_displayer()
 
     # ask the user for a color
-    if (received_request := state.transaction_sync(GetUserInput([SetColor]))) is None: return
+    received_request = yield from state.transaction_sync(GetUserInput([SetColor]))
     state.color = received_request.color
 
     state._send_update_to_displayer()
@@ -220,7 +238,7 @@ class PlusFour(Card):
     # ask them for a bluff answer
     # next_player = state.players[state.turn]
 
-    if (received_request := state.transaction_sync(GetUserInput([Bluff]))) is None: return
+    received_request = yield from state.transaction_sync(GetUserInput([Bluff]))
     call_bluff = received_request.is_bluff
 
     # we're guilty
@@ -233,7 +251,7 @@ class PlusFour(Card):
       # draw 4 cards
       for _ in range(4):
         curr_player = state.players[state.turn]
-        if (received_request := state.transaction_sync(DealCard(curr_player))) is None: return
+        received_request = yield from state.transaction_sync(DealCard(curr_player, state.discard_pile))
         curr_player.receive_card(received_request.card, state)
 
       # progress to the next player
@@ -245,7 +263,7 @@ class PlusFour(Card):
       # draw 6 cards for this player
       for _ in range(6):
         curr_player = state.players[state.turn]
-        if (received_request := state.transaction_sync(DealCard(curr_player))) is None: return
+        received_request = yield from state.transaction_sync(DealCard(curr_player, state.discard_pile))
         curr_player.receive_card(received_request.card, state)
 
       state.go_next_player()
@@ -255,7 +273,7 @@ class PlusFour(Card):
       # draw 4 cards for this player
       for _ in range(4):
         curr_player = state.players[state.turn]
-        if (received_request := state.transaction_sync(DealCard(curr_player))) is None: return
+        received_request = yield from state.transaction_sync(DealCard(curr_player, state.discard_pile))
         curr_player.receive_card(received_request.card, state)
 
       state.go_next_player()
@@ -264,13 +282,12 @@ class PlusFour(Card):
     return 50
 
 class Wild(Card):
-  def __init__(self):
-    super().__init__(color=None, number=None)
+  __slots__ = ()
 
   def is_playable(self, top_card: Card, deck_color: Color) -> bool:
     return True
   
-  def play_card(self, state: UNO) -> None:
+  def play_card(self, state: UNO) -> Generator[None, Request, None]:
     # place the card on the discard pile
     state.discard_pile.push(self)
 
@@ -278,7 +295,7 @@ class Wild(Card):
 
     # ask the user for a color
     # curr_player = state.players[state.turn]
-    if (received_request := state.transaction_sync(GetUserInput([SetColor]))) is None: return
+    received_request = yield from state.transaction_sync(GetUserInput([SetColor]))
     state.color = received_request.color
 
     state._send_update_to_displayer()
@@ -288,3 +305,50 @@ class Wild(Card):
 
   def get_value(self):
     return 50
+
+
+# the canonical table of the 54 distinct cards, indexed by card_id and sorted the same way a hand is
+CARDS: tuple[Card, ...] = (PlusFour(), Wild()) + tuple(
+  card
+  for color in [Color.RED, Color.YELLOW, Color.GREEN, Color.BLUE]
+  for card in [*(Number(color, number) for number in range(10)), PlusTwo(color), Reverse(color), Skip(color)]
+)
+NUM_CARD_KINDS = len(CARDS)
+assert all(card.card_id == card_id for card_id, card in enumerate(CARDS))
+
+############################ Playability masks ############################
+
+# masks are sets of card kinds, with bit card_id set for each kind in the set.
+# the key includes the number of interned kinds, so a new off-table card just adds new entries
+_playable_masks: dict[tuple[int, Optional[Color], int], int] = {}
+_other_options_masks: dict[tuple[Optional[Color], int], int] = {}
+
+# every kind that can be played on top_card when the deck is deck_color
+def playable_mask(top_card: Card, deck_color: Optional[Color]) -> int:
+  key = (top_card.card_id, deck_color, len(Card._interned))
+  if (mask := _playable_masks.get(key)) is None:
+    mask = 0
+    for card in list(Card._interned.values()):
+      if card.is_playable(top_card, deck_color):
+        mask |= card.bit
+    _playable_masks[key] = mask
+  return mask
+
+# every kind that means a +4 was a bluff:
+# 1. is not a plus 4
+# 2. matches the color of the deck or is a wild card
+def other_options_mask(deck_color: Optional[Color]) -> int:
+  key = (deck_color, len(Card._interned))
+  if (mask := _other_options_masks.get(key)) is None:
+    mask = 0
+    for card in list(Card._interned.values()):
+      if card.type != PlusFour and (card.type == Wild or card.color == deck_color):
+        mask |= card.bit
+    _other_options_masks[key] = mask
+  return mask
+
+# precompute the table for every (top card, color) pair that can come up in a game
+for _top_card in CARDS:
+  for _deck_color in [None, Color.RED, Color.YELLOW, Color.GREEN, Color.BLUE]:
+    playable_mask(_top_card, _deck_color)
+    other_options_mask(_deck_color)
@@ -0,0 +1,102 @@
+'''
+Sits between UNO and the manager queue and merges bursts of display updates.
+
+A single card can change the state many times before anyone has to look at it
+(a +4 deals four cards, the init phase deals a whole table), so only the newest
+CurrentState is held on to and sent:
+ * once the update window has passed since the first held state
+ * right before anything the displayers or a person has to act on (GetUserInput, RoundOver, GameOver)
+
+Every other request goes straight through, so the last state is never lost and
+never ends up behind a round or game over. With no update window nothing is held,
+every state goes out as soon as it comes in (a state correction that comes in while
+the game waits on input would otherwise sit there until the next request).
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from typing import Optional
+from queue import Queue
+from threading import Thread, Condition
+import asyncio
+import time
+
+from uno.requests import *
+
+
+class UpdateCoalescer:
+  # states are flushed before these go out
+  FLUSH_BEFORE = [GetUserInput, RoundOver, GameOver]
+
+  def __init__(self, output_queue: Queue[Request], update_window: Optional[float] = 0.016, loop: Optional[asyncio.AbstractEventLoop] = None):
+    self._output_queue = output_queue
+    self.update_window = update_window
+
+    # when the state runs on an event loop, the window is a timer on that loop instead of a thread
+    self._loop = loop
+    self._timer: Optional[asyncio.TimerHandle] = None
+
+    self._pending: Optional[CurrentState] = None
+    self._deadline = 0.0
+    self.num_received = 0
+    self.num_sent = 0
+
+    # the uno threads and the timer thread all go through here
+    self._cond = Condition()
+
+    if update_window is not None and loop is None:
+      Thread(target=self._timer_loop, name='UpdateCoalescer', daemon=True).start()
+
+  def put(self, request: Request) -> None:
+    with self._cond:
+      if type(request) is CurrentState:
+        self.num_received += 1
+        if self.update_window is None:
+          self._output_queue.put(request)
+          self.num_sent += 1
+          return
+        if self._pending is None:
+          self._deadline = time.monotonic() + self.update_window
+          if self._loop is not None:
+            self._timer = self._loop.call_later(self.update_window, self.flush)
+          else:
+            self._cond.notify()
+        self._pending = request
+        return
+
+      if type(request) in UpdateCoalescer.FLUSH_BEFORE:
+        self._flush()
+      self._output_queue.put(request)
+
+  # sends the held state now, if there is one
+  def flush(self) -> None:
+    with self._cond:
+      self._flush()
+
+  # drops the held state, used when the game is reset
+  def clear(self) -> None:
+    with self._cond:
+      if self._timer is not None:
+        self._timer.cancel()
+        self._timer = None
+      self._pending = None
+
+  def _flush(self) -> None:
+    if self._timer is not None:
+      self._timer.cancel()
+      self._timer = None
+    if self._pending is not None:
+      self._output_queue.put(self._pending)
+      self._pending = None
+      self.num_sent += 1
+
+  def _timer_loop(self) -> None:
+    with self._cond:
+      while True:
+        if self._pending is None:
+          self._cond.wait()
+        elif (remaining := self._deadline - time.monotonic()) > 0:
+          self._cond.wait(remaining)
+        else:
+          self._flush()
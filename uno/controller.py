@@ -2,46 +2,49 @@
 from __future__ import annotations
 
 import os
-from threading import Thread, Lock
+from threading import Thread, Event
 import time
 import numpy as np
 
-from typing import Optional
-from queue import Queue
+from typing import Callable, Optional
+from queue import Queue, Empty
+from concurrent.futures import Future, wait
 import sys
 import select
 
-import serial
-try:
-  from picamera2 import Picamera2
-  import gpiod
-except ImportError:
-  print('WARNING: Hardware modules not installed')
-
 from uno.card import Card, Color
 from uno.deck import Deck
 from uno.player import Player
-from uno.displayer import TkDisplayer
+from uno.keypad import Keypad, GpioBackend, GpiodBackend
+from uno.serial_transport import SerialTransport
+from uno.motion import RotationPlanner
 
-from classification.forward import init_model, get_card
 from uno.utils import card_from_classification
 from uno.requests import *
+from uno import tracing
 from uno.utils import card_from_string, color_from_string
 
 from typing import Collection
 
 
+# a subsystem the controller needs didn't come up (see HardwareController.wait_for)
+class StageFailed(RuntimeError):
+  pass
+
+
 class Controller:
   OutgoingRequests = [PlayCard, DealtCard, SkipTurn, SetColor, Bluff, CallUNO, UNOFail]
   IncomingActionRequests = [GoNextPlayer, DealCard]
+  # set by controllers that own a device there is only one of (stdin, the dealer), so only one table can use them
+  single_instance = False
 
   def __init__(self, input_queue: Queue[Request], output_queue: Queue[Request]): 
     self._input_queue = input_queue # requests coming in from the manager or internally
     self._output_queue = output_queue # requests going out to the manager 
     self._listener_queue: Queue[Request] = Queue()
     self._stop_queue: Queue[bool] = Queue()
-    self._main_loop_thread = Thread(target=self._main_loop, daemon=True)
-    self._input_listener_thread = Thread(target=self._input_listener, daemon=True)
+    self._main_loop_thread = Thread(target=self._main_loop, name=type(self).__name__, daemon=True)
+    self._input_listener_thread = Thread(target=self._input_listener, name=f'{type(self).__name__} listener', daemon=True)
 
   def start(self):
     self._main_loop_thread.start()
@@ -59,21 +62,36 @@ class Controller:
   def _main_loop(self):
     while True:
       # blocks until there is some request to handle (either something from the manager or a button press)
-      request = self._input_queue.get()
-
-      if type(request) is ControllerReset:
-        self._output_queue.put(Reset())
-      elif type(request) is ControllerRoundReset:
-        self._output_queue.put(RoundReset())
-      elif type(request) is GetUserInput:
-        self._handle_action(request)
-        self._listener_queue.put(request)
-      elif type(request) in Controller.OutgoingRequests:
-        self._output_queue.put(request)
-      elif type(request) in Controller.IncomingActionRequests:
-        self._handle_action(request)
-      else:
-        print(f'Controller received invalid {type(request)} request!')
+      try:
+        request = self._input_queue.get(timeout=self._idle_timeout())
+      except Empty:
+        request = None
+      if request is not None:
+        tracing.hop(request, 'controller')
+
+      # a request that needs a broken subsystem is dropped, resets still go through
+      try:
+        if request is None:
+          self._handle_idle()
+        else:
+          self._dispatch(request)
+      except StageFailed as e:
+        print(f'ERROR: Dropped {request if request is not None else "idle work"}: {e} ({e.__cause__!r})')
+
+  def _dispatch(self, request: Request) -> None:
+    if type(request) is ControllerReset:
+      self._output_queue.put(Reset())
+    elif type(request) is ControllerRoundReset:
+      self._output_queue.put(RoundReset())
+    elif type(request) is GetUserInput:
+      self._handle_action(request)
+      self._listener_queue.put(request)
+    elif type(request) in Controller.OutgoingRequests:
+      self._output_queue.put(request)
+    elif type(request) in Controller.IncomingActionRequests:
+      self._handle_action(request)
+    else:
+      print(f'Controller received invalid {type(request)} request!')
 
   # to be implemented by derived classes
   def _input_listener(self):
@@ -83,12 +101,22 @@ class Controller:
   def _handle_action(self, request):
     pass
 
+  # seconds without requests after which _handle_idle is called, None never calls it
+  def _idle_timeout(self) -> Optional[float]:
+    return None
+
+  def _handle_idle(self) -> None:
+    pass
+
 
 class TerminalController(Controller):
   POLL_RATE = 0.01
+  single_instance = True
 
-  def __init__(self, input_queue: Queue[Request], output_queue: Queue[Request]):
+  def __init__(self, input_queue: Queue[Request], output_queue: Queue[Request], seed: Optional[int] = None):
     super().__init__(input_queue, output_queue)
+    # every deck we deal from is shuffled from this, so a seed fixes every deal
+    self.rng = np.random.default_rng(seed)
 
   @staticmethod
   def is_input_available():
@@ -160,15 +188,90 @@ class TerminalController(Controller):
 
   def _handle_action(self, request: Request) -> None:
     if type(request) is DealCard:
+      # out of cards, turn the discard pile over like a real dealer would (the state empties its own pile)
+      num_recycled = 0
+      if not self.draw_pile.cards:
+        recyclable = request.recyclable()
+        self.draw_pile.recycle(recyclable)
+        num_recycled = len(recyclable)
+      # everyone is holding on to the cards, open another deck
+      if not self.draw_pile.cards:
+        print('WARNING: Out of cards, dealing from a new deck')
+        self.draw_pile = Deck(Deck.TOTAL_CARDS, seed=self.rng)
       dealt_card = self.draw_pile.pop()
-      self._output_queue.put(DealtCard(dealt_card, request.player))
+      self._output_queue.put(DealtCard(dealt_card, request.player, num_recycled))
+
+  def reset(self):
+    self.draw_pile: Deck = Deck(Deck.TOTAL_CARDS, seed=self.rng)
+    super().reset()
+
+
+# plays the game from a file of terminal commands, one command each time input is asked for,
+# so with a seed the whole game always goes the same way
+class ScriptedController(TerminalController):
+  CONTROL_COMMANDS = ['reset', 'round_reset']
+  # it never reads stdin
+  single_instance = False
+
+  def __init__(self, input_queue: Queue[Request], output_queue: Queue[Request], script_path: str, seed: Optional[int] = None):
+    super().__init__(input_queue, output_queue, seed)
+    with open(script_path) as f:
+      lines = [line.strip() for line in f]
+    # blank lines and comments are skipped
+    self.script = [line for line in lines if line and not line.startswith('#')]
+    self.script_idx = 0
+
+  def start(self):
+    super().start()
+    # the script starts the game itself
+    self._run_control_command()
+
+  # there is no one to listen to, just throw away what the main loop sends
+  def _input_listener(self):
+    while True:
+      self._listener_queue.get()
+
+  def _handle_action(self, request: Request) -> None:
+    if type(request) is not GetUserInput:
+      super()._handle_action(request)
+      return
+
+    allowed_input_types = [ControllerReset, ControllerRoundReset, *request.request_types]
+    while (cmd := self._next_command()) is not None:
+      try:
+        scripted_request = TerminalController.cmd_to_request(cmd)
+      except:
+        print(f'Error when parsing script line: {cmd}')
+        continue
+
+      if type(scripted_request) not in allowed_input_types:
+        print(f'Skipping script line {cmd}, expected one of {[request_type.__name__ for request_type in request.request_types]}')
+        continue
+
+      # pass along info for CallUNO and PlayCard
+      if type(scripted_request) in [PlayCard, CallUNO, SkipTurn]:
+        scripted_request.for_drawn_card = request.for_drawn_card
+      self._input_queue.put(scripted_request)
+      return
 
   def reset(self):
-    self.draw_pile: Deck = Deck(Deck.TOTAL_CARDS)
     super().reset()
+    # a round or game just ended (or restarted), the script says what happens next
+    self._run_control_command()
+
+  def _run_control_command(self) -> None:
+    if self.script_idx < len(self.script) and self.script[self.script_idx] in ScriptedController.CONTROL_COMMANDS:
+      self._input_queue.put(TerminalController.cmd_to_request(self._next_command()))
+
+  def _next_command(self) -> Optional[str]:
+    if self.script_idx == len(self.script):
+      print('Reached the end of the script')
+      return None
+    self.script_idx += 1
+    return self.script[self.script_idx - 1]
   
 class HardwareController(Controller):
-  POLL_RATE = 0.01
+  single_instance = True
 
   row_pins = [
   ("r1", 6),
@@ -183,6 +286,9 @@ class HardwareController(Controller):
 
   status_led_pin = ("status", 16)
 
+  # the arduino running motor_driver/motor_driver.ino (or a MotorDriverEmulator's port)
+  serial_port = "/dev/ttyACM0"
+
   key_map: list[list[Optional[type[Request]]]] = [[PlayCard, CallUNO, SetColor],
                                                   [SkipTurn, UNOFail, SetColor],
                                                   [ControllerRoundReset, Bluff, SetColor],
@@ -190,29 +296,82 @@ class HardwareController(Controller):
   bluff_map: dict[int, bool] = {2: True, 3: False}
   color_map: list[Color] = [Color.RED, Color.BLUE, Color.GREEN, Color.YELLOW]
 
+  # models in the order they are first needed, dealing needs the color and bottom models first
+  model_files: dict[str, str] = {'model_color': 'model_color_pretrain.pth',
+                                 'model_bot': 'model_bot_pretrain.pth',
+                                 'model_top': 'model_top_pretrain.pth'}
+
+  # seconds the requests have to stop for before a planned rotation is made
+  ROTATION_SETTLE = 0.02
+
   def __init__(self, input_queue: Queue[Request], output_queue: Queue[Request]):
     super().__init__(input_queue, output_queue)
-    self.lock_init()
-    self.ser_init()
-    self.cam_init()
-    self.gpio_init()
-    self.model_init()
-
-  def lock_init(self):
-    self.keypad_lock = Lock()
 
+    # rotations are merged and only made when needed (see uno/motion.py)
+    self.rotation = RotationPlanner()
+    self._last_rotation: Optional[Future[str]] = None
+
+    # set while a deal waits to be confirmed on the keypad, the listener hands it the press
+    # (True), a reset gives up on the deal (False)
+    self._deal_confirmation: Optional[Queue[bool]] = None
+
+    # every subsystem comes up on its own thread, anything that needs one waits for it (see wait_for)
+    self.stage_ready: dict[str, Event] = {}
+    self.stage_times: dict[str, float] = {}
+    self.stage_errors: dict[str, BaseException] = {}
+    self._init_start = time.perf_counter()
+    self._start_stages(('serial', self.ser_init))
+    self._start_stages(('cameras', self.cam_init))
+    self._start_stages(('gpio', self.gpio_init))
+    # unpickling holds the gil, so the models load one after another in the background
+    self._start_stages(*[(model_name, lambda model_name=model_name: self.model_init(model_name))
+                         for model_name in HardwareController.model_files])
+
+  # runs the init functions one after another on a new thread, marking each stage ready as it finishes
+  def _start_stages(self, *stages: tuple[str, Callable[[], None]]) -> None:
+    for stage, _ in stages:
+      self.stage_ready[stage] = Event()
+
+    def run_stages():
+      for stage, init in stages:
+        start = time.perf_counter()
+        try:
+          init()
+        except BaseException as e:
+          self.stage_errors[stage] = e
+          print(f'ERROR: HardwareController {stage} failed to start: {e!r}')
+        self.stage_times[stage] = time.perf_counter() - start
+        self.stage_ready[stage].set()
+        if stage not in self.stage_errors:
+          print(f'HardwareController {stage} ready in {self.stage_times[stage]:.2f} s '
+                f'({time.perf_counter() - self._init_start:.2f} s since start)')
+
+    Thread(target=run_stages, name=f'HardwareController {stages[0][0]} init', daemon=True).start()
+
+  # blocks until the stages are up
+  def wait_for(self, *stages: str) -> None:
+    for stage in stages:
+      self.stage_ready[stage].wait()
+      if stage in self.stage_errors:
+        raise StageFailed(f'HardwareController {stage} failed to start') from self.stage_errors[stage]
+
+  # the hardware libraries and torch are only imported once a hardware controller is made,
+  # so terminal runs don't pay for them
   def ser_init(self) -> None:
-    self.ser = serial.Serial("/dev/ttyACM0", 9600, timeout=30)
+    self.motor = SerialTransport(HardwareController.serial_port, 9600, timeout=30)
+    # the board resets when the port is opened
     time.sleep(2)
 
-  def ser_wait(self) -> str:
-    while True:
-      if self.ser.in_waiting > 0:
-        return self.ser.readline().decode("ascii").strip()
-      time.sleep(HardwareController.POLL_RATE)
-        
+  # a rotation nobody waits on still gets reported if it fails
+  @staticmethod
+  def _check_motor(future: Future[str]) -> None:
+    if (e := future.exception()) is not None:
+      print(f'WARNING: Motor command failed: {e!r}')
+
 
   def cam_init(self) -> None:
+    from picamera2 import Picamera2
+
     self.cam_bot = Picamera2(0)
     self.cam_config = self.cam_bot.create_still_configuration({"size": (360, 360)})
     self.cam_bot.configure(self.cam_config)
@@ -222,65 +381,71 @@ class HardwareController(Controller):
     self.cam_top.start(show_preview=False)
 
   def gpio_init(self) -> None:
-    chip = gpiod.Chip('gpiochip4')
-    self.row_lines = []
-    for (consumer, pin) in HardwareController.row_pins:
-        self.row_lines.append(chip.get_line(pin))
-        self.row_lines[-1].request(consumer = consumer, type=gpiod.LINE_REQ_DIR_IN, flags=gpiod.LINE_REQ_FLAG_BIAS_PULL_DOWN)
-    self.col_lines = []
-    for (consumer, pin) in HardwareController.col_pins:
-        self.col_lines.append(chip.get_line(pin))
-        self.col_lines[-1].request(consumer = consumer, type=gpiod.LINE_REQ_DIR_OUT)
-        self.col_lines[-1].set_value(0)
-    self.led_line = chip.get_line(self.status_led_pin[1])
-    self.led_line.request(consumer=self.status_led_pin[0], type=gpiod.LINE_REQ_DIR_OUT)
-
-  def keypad_read(self) -> Optional[tuple[int, int]]:
-    self.keypad_lock.acquire()
-    for (i, col) in enumerate(self.col_lines):
-      col.set_value(1)
-      for (j, row) in enumerate(self.row_lines):
-        if row.get_value() == 1:
-          while row.get_value() == 1:
-            time.sleep(HardwareController.POLL_RATE)
-          time.sleep(0.050)
-          col.set_value(0)
-          self.keypad_lock.release()
-          return (j, i)
-      col.set_value(0)
-    self.keypad_lock.release()
-    return None
+    self.keypad = Keypad(self.make_gpio_backend())
+
+  # override to run the keypad on something other than the Pi's gpio (see uno/keypad.py)
+  def make_gpio_backend(self) -> GpioBackend:
+    return GpiodBackend('gpiochip4', HardwareController.row_pins, HardwareController.col_pins, HardwareController.status_led_pin)
+
+  # blocks until a key is pressed (or timeout passes), returns (row, col)
+  def keypad_read(self, timeout: Optional[float] = None) -> Optional[tuple[int, int]]:
+    return self.keypad.read(timeout)
+
+  def model_init(self, model_name: str) -> None:
+    from classification.forward import init_model
 
-  def model_init(self) -> None:
     file_dir = os.path.split(__file__)[0]
     model_dir = os.path.join(file_dir,'../classification/models')
-    self.model_top = init_model(os.path.join(model_dir, 'model_top_pretrain.pth'), True)
-    self.model_bot = init_model(os.path.join(model_dir, 'model_bot_pretrain.pth'), True)
-    self.model_color = init_model(os.path.join(model_dir, 'model_color_pretrain.pth'), True)
+    setattr(self, model_name, init_model(os.path.join(model_dir, HardwareController.model_files[model_name]), True))
     
   def _input_listener(self):
+    # resets come in through the keypad, so they work as soon as it is up
+    try:
+      self.wait_for('gpio')
+    except StageFailed as e:
+      print(f'ERROR: No keypad input this session, resets only come from the website: {e} ({e.__cause__!r})')
+      return
+
     allowed_input_types = [ControllerRoundReset, ControllerReset]
     for_drawn_card = False
-    # poll forever
     while True:
-      if not self._listener_queue.empty():
-
-        request = self._listener_queue.get()
-        if type(request) is Reset:
-          allowed_input_types = [ControllerRoundReset, ControllerReset]
-          for_drawn_card = False
-          continue
-        else:
-          allowed_input_types += request.request_types
-          for_drawn_card = request.for_drawn_card
-      
+      # sleeps until a key is pressed
       if (button_press := self.keypad_read()) is not None:
+        press_time = time.perf_counter()
+
+        if (confirmation := self._deal_confirmation) is not None:
+          pressed_type = self.key_map[button_press[0]][button_press[1]]
+          if pressed_type is PlayCard:
+            confirmation.put(True)
+            continue
+          # the main loop is stuck on the deal, so it has to give up on it before it can see the reset
+          if pressed_type in [ControllerRoundReset, ControllerReset]:
+            confirmation.put(False)
+
+        # what we are allowed to send only matters once a key is pressed
+        while not self._listener_queue.empty():
+          request = self._listener_queue.get()
+          if type(request) is Reset:
+            allowed_input_types = [ControllerRoundReset, ControllerReset]
+            for_drawn_card = False
+          else:
+            allowed_input_types += request.request_types
+            for_drawn_card = request.for_drawn_card
+
         request_type = self.key_map[button_press[0]][button_press[1]]
 
         if request_type not in allowed_input_types:
           continue
 
         if request_type in [PlayCard, CallUNO]:
+          # the first classification waits on whatever is still loading
+          try:
+            self.wait_for('cameras', 'model_top', 'model_color')
+          except StageFailed as e:
+            print(f'ERROR: Can\'t classify the card: {e} ({e.__cause__!r})')
+            continue
+          from classification.forward import get_card
+
           image = self.cam_top.capture_array().astype(np.float32) / 255
           card = card_from_classification(*get_card(self.model_top, self.model_color, image, True))
           request = request_type(card)
@@ -297,50 +462,85 @@ class HardwareController(Controller):
         if request_type in [PlayCard, CallUNO, SkipTurn]:
           request.for_drawn_card = for_drawn_card
         
+        # the trace starts at the button press, so classifying the card is counted
+        tracing.started_at(request, press_time)
+
         # fix this to first construct the types 
         self._input_queue.put(request)
         allowed_input_types = [ControllerRoundReset, ControllerReset]
         for_drawn_card = False
-      
-      time.sleep(HardwareController.POLL_RATE)
+
+  # turns the dealer to the planned seat, if it isn't already headed there
+  def rotate(self) -> None:
+    if (steps := self.rotation.flush()) != 0:
+      self.wait_for('serial')
+      # the board works through commands in order, so the next deal happens after the rotation anyway
+      self._last_rotation = self.motor.send(f'r{steps}')
+      self._last_rotation.add_done_callback(HardwareController._check_motor)
+
+  # blocks until the dealer has stopped turning
+  def wait_for_rotation(self) -> None:
+    if (rotation := self._last_rotation) is not None:
+      # a failed rotation was already reported, the card still gets dealt
+      wait([rotation])
+
+  def _idle_timeout(self) -> Optional[float]:
+    return HardwareController.ROTATION_SETTLE if self.rotation.has_pending else None
+
+  def _handle_idle(self) -> None:
+    self.rotate()
 
   def _handle_action(self, request: Request) -> None:
     if type(request) is GoNextPlayer:
-      steps = request.dir * (200*4) // request.num_players
-      self.ser.write(f'r{steps}\n'.encode("ascii"))
-      _ = self.ser_wait()
+      self.rotation.rotate(request.dir, request.num_players)
     elif type(request) is GetUserInput:
+      # the player being asked should be facing the dealer
+      self.rotate()
+      self.wait_for('gpio')
       if self.invalid_card != request.for_invalid_card:
-        self.led_line.set_value(int(request.for_invalid_card))
+        self.keypad.backend.set_led(request.for_invalid_card)
     elif type(request) is DealCard:
+      self.rotate()
+      self.wait_for('serial', 'cameras')
+      # the bottom card can only be photographed once the dealer stands still
+      self.wait_for_rotation()
       image = self.cam_bot.capture_array().astype(np.float32) / 255
 
-      self.ser.write("d\n".encode("ascii"))
+      dealt = self.motor.send('d')
+      # the card is dealt while the models finish loading and it is classified
+      self.wait_for('model_bot', 'model_color')
+      from classification.forward import get_card
       labels = get_card(self.model_bot, self.model_color, image, False)
-      if self.ser_wait() == "t":
+
+      try:
+        is_dealt = dealt.result() == 't'
+      except TimeoutError:
+        print('WARNING: The motor driver never answered the deal')
+        is_dealt = False
+
+      if is_dealt:
         card = card_from_classification(*labels)
         self._output_queue.put(DealtCard(card, request.player))
         return
 
       # for _ in range(2):
-      #   self.ser.write("u\n".encode("ascii"))
-      #   _ = self.ser_wait()
-      #   self.ser.write("u\n".encode("ascii"))
-      #   _ = self.ser_wait()
-      #   self.ser.write("d\n".encode("ascii"))
-      #   if self.ser_wait() == "t":
+      #   self.motor.request("u")
+      #   self.motor.request("u")
+      #   if self.motor.request("d") == "t":
       #     card = card_from_classification(*labels)
       #     self._output_queue.put(DealtCard(card, request.player))
       #     return
-      #   self.ser.write("u\n".encode("ascii"))
-      #   _ = self.ser_wait()
-
-      while True:
-        button_press = self.keypad_read()
-        if button_press is None:
-          continue
-        if self.key_map[button_press[0]][button_press[1]] is PlayCard:
-          break
+      #   self.motor.request("u")
+
+      # someone has to confirm the deal on the keypad, the listener is the only one reading it
+      self.wait_for('gpio')
+      confirmation: Queue[bool] = Queue()
+      self._deal_confirmation = confirmation
+      try:
+        if not confirmation.get():
+          return
+      finally:
+        self._deal_confirmation = None
 
       card = card_from_classification(*labels)
       self._output_queue.put(DealtCard(card, request.player))
@@ -348,5 +548,8 @@ class HardwareController(Controller):
 
   def reset(self):
     self.invalid_card = False
+    self.rotation.reset()
+    if (confirmation := self._deal_confirmation) is not None:
+      confirmation.put(False)
     super().reset()
   
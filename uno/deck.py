@@ -3,7 +3,6 @@ from __future__ import annotations
 from typing import Optional
 
 import numpy as np
-import json
 
 from uno.card import Color
 from uno.card import Card, Number, PlusTwo, Skip, Reverse, PlusFour, Wild
@@ -19,15 +18,45 @@ class Deck:
   PLUSFOUR_CARDS = 4
   WILD_CARDS = 4
 
-  def __init__(self, num_cards: int):
-    self.cards = [Deck.generate_card() for _ in range(num_cards)]
+  def __init__(self, num_cards: int = 0, seed: Optional[int | np.random.Generator] = None):
+    # decks without a seed share one generator so they are cheap to create
+    self.rng: np.random.Generator = np.random.default_rng(seed) if seed is not None else _shared_rng
+
+    # take the cards off the top of as many shuffled decks as we need
+    self.cards: list[Card] = []
+    while len(self.cards) < num_cards:
+      self.cards += _FULL_DECK_ARRAY[self.rng.permutation(Deck.TOTAL_CARDS)].tolist()
+    del self.cards[num_cards:]
 
   def push(self, card: Card) -> None:
     self.cards.append(card)
 
   def pop(self) -> Card:
     return self.cards.pop()
-  
+
+  # takes num_cards off the top, in the order pop would return them
+  def deal(self, num_cards: int) -> list[Card]:
+    dealt = self.cards[:-num_cards - 1:-1] if num_cards > 0 else []
+    del self.cards[len(self.cards) - len(dealt):]
+    return dealt
+
+  def shuffle(self) -> None:
+    self.rng.shuffle(self.cards)
+
+  # moves everything but the top card of the discard pile under this deck, shuffled
+  def reshuffle(self, discard_pile: Deck) -> None:
+    self.recycle(discard_pile.cards[:-1])
+    del discard_pile.cards[:-1]
+
+  # puts a copy of cards under this deck, shuffled
+  def recycle(self, cards: list[Card]) -> None:
+    recycled = list(cards)
+    self.rng.shuffle(recycled)
+    self.cards[:0] = recycled
+
+  def __len__(self) -> int:
+    return len(self.cards)
+
   def peek(self) -> Optional[Card]:
     return self.cards[-1] if self.cards else None
   
@@ -44,44 +73,54 @@ class Deck:
     }
     return obj
 
-  # generates non-replacing cards based on distribution of UNO cards
+  # immutable copy of the top max_cards cards
+  def snapshot(self, max_cards: Optional[int] = None) -> PileSnapshot:
+    return PileSnapshot(tuple(self.cards[-max_cards:] if max_cards else self.cards))
+
+  # every physical card in a single deck
   @staticmethod
-  def generate_card():
-    # create distribution for card types 
-    types = np.array([Number, PlusTwo, Skip, Reverse, PlusFour, Wild])
-    types_dist = np.array([
-      Deck.NUMBER_CARDS,
-      Deck.PLUSTWO_CARDS,
-      Deck.SKIP_CARDS,
-      Deck.REVERSE_CARDS,
-      Deck.PLUSFOUR_CARDS,
-      Deck.WILD_CARDS
-    ]) / Deck.TOTAL_CARDS
-
-    # create distribution for card colors
-    colors = [Color.RED, Color.YELLOW, Color.GREEN, Color.BLUE]
-    colors_dist = np.ones(Color.NUM_COLORS) / Color.NUM_COLORS
-
-    # create distribution for card numbers
-    numbers = np.arange(10)
-    numbers_dist = np.empty(10)
-    numbers_dist[0] = Color.NUM_COLORS
-    numbers_dist[1:] = 2 * Color.NUM_COLORS
-    numbers_dist /= Deck.NUMBER_CARDS
-
-    # generate card type
-    card_type = np.random.choice(types, p=types_dist)
-
-    # generate card color 
-    card_color = colors[np.random.choice(Color.NUM_COLORS, p=colors_dist)]
-
-    # generate card number
-    card_number = np.random.choice(numbers, p=numbers_dist)
-
-    # create the correct card
-    if card_type == PlusFour or card_type == Wild:
-      return card_type()
-    elif card_type == PlusTwo or card_type == Skip or card_type == Reverse:
-      return card_type(color=card_color)
-    else: # number card
-      return card_type(color=card_color, number=card_number)
\ No newline at end of file
+  def full_deck() -> list[Card]:
+    cards: list[Card] = []
+    for color in [Color.RED, Color.YELLOW, Color.GREEN, Color.BLUE]:
+      # 2 per number (1 through 9) + 1 zero
+      cards.append(Number(color, 0))
+      for number in range(1, 10):
+        cards += [Number(color, number)] * 2
+      for card_type in [PlusTwo, Skip, Reverse]:
+        cards += [card_type(color)] * 2
+    cards += [PlusFour()] * Deck.PLUSFOUR_CARDS
+    cards += [Wild()] * Deck.WILD_CARDS
+    return cards
+
+
+# what the displayers see of a pile, the cards are ordered from bottom to top
+class PileSnapshot:
+  __slots__ = ('cards',)
+
+  def __init__(self, cards: tuple[Card, ...]):
+    self.cards = cards
+
+  def __copy__(self) -> PileSnapshot:
+    return self
+
+  def __deepcopy__(self, memo) -> PileSnapshot:
+    return self
+
+  def peek(self) -> Optional[Card]:
+    return self.cards[-1] if self.cards else None
+
+  def __len__(self) -> int:
+    return len(self.cards)
+
+  def __repr__(self) -> str:
+    return Deck.__repr__(self)
+
+  def to_json(self) -> str:
+    return Deck.to_json(self)
+
+
+_shared_rng = np.random.default_rng()
+
+# object array so a shuffled deck is a single fancy index
+_FULL_DECK_ARRAY = np.empty(Deck.TOTAL_CARDS, dtype=object)
+_FULL_DECK_ARRAY[:] = Deck.full_deck()
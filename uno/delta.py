@@ -0,0 +1,131 @@
+'''
+Versioned deltas between display states, so displayers don't have to resend the whole state.
+
+Every message carries a sequence number that goes up by one per message:
+ * full snapshot: the usual DisplayUNOState.to_json() with 'seq' and 'discard_history' added
+ * delta: {'seq': n, 'ops': [...]} that turns snapshot n - 1 into snapshot n
+
+Ops are applied in order:
+ * {'op': 'hand_remove', 'player': p, 'index': i}
+ * {'op': 'hand_add', 'player': p, 'index': i, 'card': card}
+ * {'op': 'player', 'player': p, <changed fields of drawn_card, name, score>}
+ * {'op': 'top_card', 'card': card} a card went on the discard pile, keep at most discard_history cards
+ * {'op': 'discard_pile', 'cards': [...]} the discard pile changed some other way
+ * {'op': 'color' | 'turn' | 'dir', <same name>: value}
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from typing import Optional
+from threading import Lock
+
+from uno.card import Card
+
+# only import what we need if we are doing type checking
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+  from uno.uno import DisplayUNOState
+  from uno.player import PlayerSnapshot
+
+
+class StateDiffer:
+  def __init__(self):
+    self.seq = 0
+    self._prev_state: Optional[DisplayUNOState] = None
+    self._send_full = True
+
+    # the displayer thread and socket callbacks both touch the sequence
+    self._lock = Lock()
+
+  # the next message will be a full snapshot, used on connect or when the receiver saw a gap
+  def force_full(self) -> None:
+    with self._lock:
+      self._send_full = True
+
+  # returns (is_full, message) for the next state
+  def update(self, state: DisplayUNOState) -> tuple[bool, dict]:
+    with self._lock:
+      prev_state = self._prev_state
+      self._prev_state = state
+      self.seq += 1
+
+      if self._send_full or prev_state is None \
+         or prev_state.num_players != state.num_players or prev_state.hand_size != state.hand_size:
+        self._send_full = False
+        return True, self._full_message(state)
+
+      return False, {'seq': self.seq, 'ops': diff_states(prev_state, state)}
+
+  # full snapshot of the last state, with its sequence number
+  def full(self) -> Optional[dict]:
+    with self._lock:
+      if self._prev_state is None:
+        return None
+      self._send_full = False
+      return self._full_message(self._prev_state)
+
+  def _full_message(self, state: DisplayUNOState) -> dict:
+    obj = state.to_json()
+    obj['seq'] = self.seq
+    obj['discard_history'] = state.DISCARD_HISTORY
+    return obj
+
+
+def diff_states(old: DisplayUNOState, new: DisplayUNOState) -> list[dict]:
+  ops = []
+  for old_player, new_player in zip(old.players, new.players):
+    # snapshots are shared while a player doesn't change
+    if old_player is not new_player:
+      ops += _diff_players(old_player, new_player)
+
+  old_cards, new_cards = old.discard_pile.cards, new.discard_pile.cards
+  if old_cards != new_cards:
+    # a card was put on top, the bottom may have fallen out of the history
+    if new_cards and (new_cards[:-1] == old_cards or (len(old_cards) == new.DISCARD_HISTORY and new_cards[:-1] == old_cards[1:])):
+      ops.append({'op': 'top_card', 'card': new_cards[-1].to_json()})
+    else:
+      ops.append({'op': 'discard_pile', 'cards': [card.to_json() for card in new_cards]})
+
+  if old.color != new.color:
+    ops.append({'op': 'color', 'color': new.color.name if new.color is not None else None})
+  if old.turn != new.turn:
+    ops.append({'op': 'turn', 'turn': new.turn})
+  if old.dir != new.dir:
+    ops.append({'op': 'dir', 'dir': new.dir})
+  return ops
+
+def _diff_players(old: PlayerSnapshot, new: PlayerSnapshot) -> list[dict]:
+  ops = []
+  if old.hand is not new.hand:
+    removed, added = diff_hands(old.hand, new.hand)
+    # removing from the back keeps the earlier indices valid
+    ops += [{'op': 'hand_remove', 'player': new.position, 'index': idx} for idx in reversed(removed)]
+    ops += [{'op': 'hand_add', 'player': new.position, 'index': idx, 'card': new.hand[idx].to_json()} for idx in added]
+
+  fields = {}
+  if old.drawn_card is not new.drawn_card:
+    fields['drawn_card'] = new.drawn_card.to_json() if new.drawn_card is not None else None
+  if old.score != new.score:
+    fields['score'] = new.score
+  if old.name != new.name:
+    fields['name'] = new.name
+  if fields:
+    ops.append({'op': 'player', 'player': new.position, **fields})
+  return ops
+
+# walks two sorted hands, returns the indices removed from old and the indices added in new
+def diff_hands(old: tuple[Card, ...], new: tuple[Card, ...]) -> tuple[list[int], list[int]]:
+  removed, added = [], []
+  i, j = 0, 0
+  while i < len(old) or j < len(new):
+    if j == len(new) or (i < len(old) and old[i].sort_key < new[j].sort_key):
+      removed.append(i)
+      i += 1
+    elif i == len(old) or new[j].sort_key < old[i].sort_key:
+      added.append(j)
+      j += 1
+    else:
+      i += 1
+      j += 1
+  return removed, added
@@ -6,30 +6,33 @@ Base class & implementations of the state displayer.
 # enables lazy type annotation resolving
 from __future__ import annotations
 
-import tkinter as tk
-from PIL import Image, ImageTk
 import io
 import os
-from threading import Thread
+from typing import Optional
+from threading import Thread, Lock
 from queue import Queue
-import socketio
 import json
 
 from uno.card import Card, Wild, PlusFour
 from uno.player import Player
+from uno.delta import StateDiffer
 from uno.requests import *
+from uno import tracing
 
 # only import what we need if we are doing type checking
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
   from uno.uno import DisplayUNOState
+  from PIL import ImageTk
 
 
 class Displayer:
   def __init__(self, input_queue: Queue[Request], output_queue: Queue[Request]):
     self._input_queue = input_queue
     self._output_queue = output_queue
-    self._main_loop_thread = Thread(target=self._main_loop, daemon=True)
+    self._main_loop_thread = Thread(target=self._main_loop, name=type(self).__name__, daemon=True)
+    # where requests reaching this displayer show up in the latency histograms
+    self._trace_stage = f'displayer:{type(self).__name__}'
 
 
   # starts the thread to listen on the queues
@@ -42,17 +45,18 @@ class Displayer:
 
   def _main_loop(self):
     while True:
-      request = self._input_queue.get()
-
-      if type(request) is CurrentState:
-        
-        self.display_state(request.state)
-      elif type(request) is GameOver:
-        self.display_game_over(request)
-      elif type(request) is RoundOver:
-        self.display_round_over(request)
-      else:
-        print('Unknown request sent to Displayer')
+      self.handle_request(self._input_queue.get())
+
+  def handle_request(self, request: Request) -> None:
+    tracing.hop(request, self._trace_stage)
+    if type(request) is CurrentState:
+      self.display_state(request.state)
+    elif type(request) is GameOver:
+      self.display_game_over(request)
+    elif type(request) is RoundOver:
+      self.display_round_over(request)
+    else:
+      print('Unknown request sent to Displayer')
 
   # display the game state in a non-blocking way
   def display_state(self, state: DisplayUNOState) -> None:
@@ -70,34 +74,84 @@ class Displayer:
   # def signal_invalid_state(self, state: UNO) -> None:
   #   pass
 
-class WebsiteDisplayer(Displayer):
-  def __init__(self, input_queue: Queue[Request], output_queue: Queue[Request], url: str):
-    super().__init__(input_queue, output_queue)
+# one socket.io connection per website, shared by the website displayers of every table
+class WebsiteConnection:
+  _connections: dict[str, WebsiteConnection] = {}
+  _connections_lock = Lock()
+
+  @staticmethod
+  def get(url: str) -> WebsiteConnection:
+    with WebsiteConnection._connections_lock:
+      if url not in WebsiteConnection._connections:
+        WebsiteConnection._connections[url] = WebsiteConnection(url)
+      return WebsiteConnection._connections[url]
+
+  def __init__(self, url: str):
+    # only pay for socket.io when a website displayer is used
+    import socketio
 
     self.url = url
     self.socketio = socketio.Client()
+    self.displayers: dict[int, WebsiteDisplayer] = {}
 
-    # connect to the web socket
-    try:
-      self.socketio.connect(self.url)
-    except:
-      print(f'Could not connect to {self.url}. Did you start the web server?')
+    # initialize the callback for (re)connecting, the website gets a full state of every table
+    @self.socketio.on('connect')
+    def receive_connect():
+      for displayer in list(self.displayers.values()):
+        displayer.differ.force_full()
+
+    # initialize the callback for the website missing a delta
+    @self.socketio.on('request_full_state')
+    def receive_full_state_request(data=None):
+      if (displayer := self._displayer_for(data)) is not None:
+        displayer.handle_full_state_request()
 
     # initialize the callback for reset
     @self.socketio.on('reset')
     def receive_reset_request(data):
-      self.handle_reset_request(data)
+      if (displayer := self._displayer_for(data)) is not None:
+        displayer.handle_reset_request(data)
 
     # initialize the callback for reset
     @self.socketio.on('round_reset')
-    def receive_round_reset_request():
-      self.handle_round_reset_request()
+    def receive_round_reset_request(data=None):
+      if (displayer := self._displayer_for(data)) is not None:
+        displayer.handle_round_reset_request()
 
     # initialize the callback for reset
     @self.socketio.on('state_correction')
     def receive_state_correction_request(data):
-      self.handle_state_correction_request(data)
+      if (displayer := self._displayer_for(data)) is not None:
+        displayer.handle_state_correction_request(data)
+
+    # connect to the web socket
+    try:
+      self.socketio.connect(self.url)
+    except:
+      print(f'Could not connect to {self.url}. Did you start the web server?')
 
+  def add_displayer(self, displayer: WebsiteDisplayer) -> None:
+    self.displayers[displayer.table_id] = displayer
+
+  # messages from the website say which table they are for, the first table if they don't
+  def _displayer_for(self, data) -> Optional[WebsiteDisplayer]:
+    table_id = data.get('table_id', 0) if isinstance(data, dict) else 0
+    return self.displayers.get(int(table_id))
+
+
+class WebsiteDisplayer(Displayer):
+  def __init__(self, input_queue: Queue[Request], output_queue: Queue[Request], url: str, table_id: int = 0):
+    super().__init__(input_queue, output_queue)
+
+    self.url = url
+    self.table_id = table_id
+
+    # the website gets deltas, with a full state on connect or when it misses one
+    self.differ = StateDiffer()
+
+    self.connection = WebsiteConnection.get(url)
+    self.socketio = self.connection.socketio
+    self.connection.add_displayer(self)
 
   def reset(self) -> None:
     pass
@@ -127,16 +181,32 @@ class WebsiteDisplayer(Displayer):
     
     self._output_queue.put(request)
 
+  # the website being gone shouldn't take the displayer down with it
+  def _emit(self, event: str, data: dict) -> None:
+    import socketio
+
+    data['table_id'] = self.table_id
+    try:
+      self.socketio.emit(event, data)
+    except socketio.exceptions.SocketIOError:
+      print(f'WARNING: Could not send {event} to {self.url}')
+      # it may have missed a delta
+      self.differ.force_full()
+
   def display_game_over(self, request: GameOver) -> None:
-    self.socketio.emit('pi_game_over', {'winning_player': request.winning_player.to_json()})
+    self._emit('pi_game_over', {'winning_player': request.winning_player.to_json()})
 
   def display_round_over(self, request: RoundOver) -> None:
-    self.socketio.emit('pi_round_over', {'winning_player': request.winning_player.to_json()})
+    self._emit('pi_round_over', {'winning_player': request.winning_player.to_json()})
+
+  def handle_full_state_request(self):
+    if (message := self.differ.full()) is not None:
+      self._emit('pi_state', message)
 
   def display_state(self, state: DisplayUNOState) -> None:
-    # package up the state and send it to the website
-    # print(state.to_json())
-    self.socketio.emit('pi_state', state.to_json())
+    # package up the changes since the last state and send them to the website
+    is_full, message = self.differ.update(state)
+    self._emit('pi_state' if is_full else 'pi_delta', message)
 
 
 class TerminalDisplayer(Displayer):
@@ -161,13 +231,13 @@ class TerminalDisplayer(Displayer):
       if player.position == state.turn:
         print('--->', end='')
         if player.drawn_card is not None:
-          print(player.hand, end='')
+          print(list(player.hand), end='')
           print(' Drawn card: ' + str(player.drawn_card))
         else:
-          print(player.hand)
+          print(list(player.hand))
       else:  
         print('    ', end='')
-        print(player.hand)
+        print(list(player.hand))
     print()
   
   def display_game_over(self, request: GameOver) -> None:
@@ -185,6 +255,9 @@ class TerminalDisplayer(Displayer):
 # DEPRICATED
 class TkDisplayer(Displayer):
   def __init__(self, input_queue: Queue[Request], output_queue: Queue[Request]):
+    import tkinter as tk
+    from PIL import Image, ImageTk
+
     super().__init__(input_queue, output_queue)
     self.window = tk.Tk()
     self.window.title('UNO!')
@@ -209,9 +282,13 @@ class TkDisplayer(Displayer):
     pass
 
   def _draw_card(self, card: Card, sx: int, sy: int):
+    import tkinter as tk
+
     self.canvas.create_image(sx, sy, anchor=tk.NW, image=self.images[card.image_name])
 
   def display_state(self, state: DisplayUNOState) -> None:
+    import tkinter as tk
+
     self.canvas.delete(tk.ALL)
     # curr_player: Player = state.players[state.turn]
     
@@ -0,0 +1,383 @@
+'''
+Headless, synchronous version of the UNO rules.
+
+The rules mirror the card sequences in uno/card.py and the turn handling in uno/uno.py,
+but everything runs as a step function instead of threads and queues:
+
+  state, decision = new_game(Reset(num_players=4), seed=0)
+  state, decision = step(state, PlayCard(card))
+
+The decision is the request the real game would send out next (a GetUserInput,
+or a RoundOver / GameOver once a round ends). Deals are resolved internally from
+a shuffled 108 card deck owned by the state.
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from typing import Optional, Callable
+import random
+
+from uno.card import Color
+from uno.card import Card, Number, PlusTwo, Skip, Reverse, PlusFour, Wild
+from uno.card import playable_mask, other_options_mask
+from uno.deck import Deck
+from uno.player import Player
+from uno.requests import *
+
+DECK_CARDS: list[Card] = Deck.full_deck()
+
+
+class EngineState:
+  # what the state is waiting on
+  TURN = 'turn'
+  DRAWN_CARD = 'drawn_card'
+  WILD_COLOR = 'wild_color'
+  PLUS_FOUR_COLOR = 'plus_four_color'
+  BLUFF = 'bluff'
+  ROUND_OVER = 'round_over'
+  GAME_OVER = 'game_over'
+
+  def __init__(self, num_players: int, hand_size: int, end_score: int, seed: int):
+    self.num_players = num_players
+    self.hand_size = hand_size
+    self.end_score = end_score
+    self.seed = seed
+    self.scores: list[int] = [0] * num_players
+    self.hands: list[list[Card]] = [[] for _ in range(num_players)]
+    self.draw_pile: list[Card] = []
+    self.discard_pile: list[Card] = []
+    self.color: Optional[Color] = None
+    self.turn: int = 0
+    self.dir: int = +1
+    self.call_uno_player: Optional[int] = None
+    self.uno_fail_player: Optional[int] = None
+    self.drawn_card: Optional[Card] = None
+
+    # whether the player who put down the +4 could have played something else
+    self.has_other_options: bool = False
+
+    self.phase: str = EngineState.TURN
+    self.decision: Optional[Request] = None
+
+    # number of completed turns in the current round
+    self.num_turns: int = 0
+    self.num_rounds: int = 0
+    self.num_shuffles: int = 0
+
+  def copy(self) -> EngineState:
+    # cards are never mutated, so copying the containers is enough
+    new_state = EngineState.__new__(EngineState)
+    new_state.__dict__.update(self.__dict__)
+    new_state.scores = self.scores.copy()
+    new_state.hands = [hand.copy() for hand in self.hands]
+    new_state.draw_pile = self.draw_pile.copy()
+    new_state.discard_pile = self.discard_pile.copy()
+    return new_state
+
+  def top_card(self) -> Optional[Card]:
+    return self.discard_pile[-1] if self.discard_pile else None
+
+  def playable_cards(self, pos: Optional[int] = None) -> list[Card]:
+    mask = playable_mask(self.top_card(), self.color)
+    hand = self.hands[self.turn if pos is None else pos]
+    return [card for card in hand if card.bit & mask]
+
+  # score the round winner would get, same as UNO.update_score
+  def round_score(self, pos: int) -> int:
+    return sum(card.get_value() for other_pos, hand in enumerate(self.hands) if other_pos != pos for card in hand)
+
+  def player(self, pos: int) -> Player:
+    player = Player(list(self.hands[pos]), pos)
+    player.score = self.scores[pos]
+    return player
+
+  def __repr__(self) -> str:
+    res = f'Top card: {self.top_card()}, Color: {self.color.name if self.color is not None else "None"}\n'
+    res += f'Player {self.turn}\n' + '\n'.join(map(lambda x: f'{x[0]}: {x[1]}', enumerate(self.hands[self.turn])))
+    return res
+
+
+# starts a brand new game from a reset request
+def new_game(request: Reset = Reset(), seed: Optional[int] = None) -> tuple[EngineState, Request]:
+  seed = seed if seed is not None else random.getrandbits(32)
+  state = EngineState(request.num_players, request.hand_size, request.end_score, seed)
+  _start_round(state)
+  return state, state.decision
+
+# applies one action to the state and returns the next decision
+def step(state: EngineState, action: Request, in_place: bool = False) -> tuple[EngineState, Request]:
+  if type(action) is Reset:
+    return new_game(action, state.seed + 1)
+
+  if not in_place:
+    state = state.copy()
+
+  if type(action) is RoundReset:
+    _start_round(state)
+    return state, state.decision
+
+  if state.phase in [EngineState.ROUND_OVER, EngineState.GAME_OVER] or type(action) not in state.decision.request_types:
+    raise ValueError(f'{action} is not a valid response to {state.decision}')
+
+  if state.phase == EngineState.TURN:
+    _handle_turn_action(state, action)
+  elif state.phase == EngineState.DRAWN_CARD:
+    _handle_drawn_card_action(state, action)
+  elif state.phase == EngineState.WILD_COLOR:
+    state.color = action.color
+    _go_next_player(state)
+  elif state.phase == EngineState.PLUS_FOUR_COLOR:
+    state.color = action.color
+    _go_next_player(state, is_turn_end=False)
+    state.phase = EngineState.BLUFF
+    state.decision = GetUserInput([Bluff])
+  elif state.phase == EngineState.BLUFF:
+    _handle_bluff(state, action.is_bluff)
+
+  return state, state.decision
+
+# plays random legal moves, useful for rule checks and load generation
+class RandomPolicy:
+  def __init__(self, seed: Optional[int] = None, call_bluff_rate: float = 0.25, forget_uno_rate: float = 0.1, catch_uno_rate: float = 0.5):
+    self.rng = random.Random(seed)
+    self.call_bluff_rate = call_bluff_rate
+    self.forget_uno_rate = forget_uno_rate
+    self.catch_uno_rate = catch_uno_rate
+
+  def __call__(self, state: EngineState) -> Optional[Request]:
+    decision = state.decision
+    if type(decision) is RoundOver:
+      return RoundReset()
+    elif type(decision) is GameOver:
+      return None
+
+    if SetColor in decision.request_types:
+      return SetColor(Color(self.rng.randrange(Color.NUM_COLORS)))
+    elif Bluff in decision.request_types:
+      return Bluff(self.rng.random() < self.call_bluff_rate)
+    elif UNOFail in decision.request_types and self.rng.random() < self.catch_uno_rate:
+      return UNOFail()
+
+    if state.phase == EngineState.DRAWN_CARD:
+      card = state.drawn_card
+    else:
+      playable_cards = state.playable_cards()
+      if not playable_cards:
+        return SkipTurn()
+      card = self.rng.choice(playable_cards)
+
+    if CallUNO in decision.request_types and self.rng.random() >= self.forget_uno_rate:
+      return CallUNO(card)
+    return PlayCard(card)
+
+# plays a whole game in place, returns the final state
+def play_game(policy: Callable[[EngineState], Optional[Request]], request: Reset = Reset(), seed: Optional[int] = None) -> EngineState:
+  state, _ = new_game(request, seed)
+  while (action := policy(state)) is not None:
+    step(state, action, in_place=True)
+  return state
+
+
+############################ Sequences ############################
+
+def _start_round(state: EngineState) -> None:
+  state.hands = [[] for _ in range(state.num_players)]
+  state.draw_pile = DECK_CARDS.copy()
+  state.discard_pile = []
+  _shuffle(state, state.draw_pile)
+  state.color = None
+  state.turn = 0
+  state.dir = +1
+  state.call_uno_player = None
+  state.uno_fail_player = None
+  state.drawn_card = None
+  state.num_turns = 0
+  state.num_rounds += 1
+
+  for pos in range(state.num_players):
+    for _ in range(state.hand_size):
+      _deal_card(state, pos)
+    _go_next_player(state, is_turn_end=False)
+
+  # get the initial card, wild cards stay on the table under it like in UNO.run_init_phase
+  while type(card := state.draw_pile.pop()) in [Wild, PlusFour]:
+    state.discard_pile.append(card)
+
+  _play_card(state, card)
+
+def _handle_turn_action(state: EngineState, action: Request) -> None:
+  if type(action) in [PlayCard, CallUNO]:
+    card = action.card
+    hand = state.hands[state.turn]
+    if not card.bit & playable_mask(state.top_card(), state.color) or card not in hand:
+      request_list = [PlayCard, SkipTurn]
+      if state.uno_fail_player is not None: request_list.append(UNOFail)
+      if state.call_uno_player is not None: request_list.append(CallUNO)
+      state.decision = GetUserInput(request_list, for_invalid_card=True)
+      return
+
+    state.uno_fail_player = None
+    if type(action) is CallUNO:
+      state.call_uno_player = None
+
+    hand.remove(card)
+    _play_card(state, card)
+
+  elif type(action) is UNOFail:
+    # punish the player that forgot to call UNO, the turn doesn't move
+    pos = state.uno_fail_player
+    state.uno_fail_player = None
+    for _ in range(4):
+      _deal_card(state, pos)
+
+    request_list = [PlayCard, SkipTurn]
+    if state.call_uno_player is not None:
+      request_list.append(CallUNO)
+    state.decision = GetUserInput(request_list)
+
+  elif type(action) is SkipTurn:
+    state.uno_fail_player = None
+    state.call_uno_player = state.turn if len(state.hands[state.turn]) == 1 else None
+
+    # draw a card and see if it can be played right away
+    card = _draw(state)
+    if card is not None and card.bit & playable_mask(state.top_card(), state.color):
+      state.drawn_card = card
+      request_list = [PlayCard, SkipTurn]
+      if state.call_uno_player is not None:
+        request_list.append(CallUNO)
+      state.phase = EngineState.DRAWN_CARD
+      state.decision = GetUserInput(request_list, for_drawn_card=True)
+      return
+
+    if card is not None:
+      state.hands[state.turn].append(card)
+    _go_next_player(state)
+
+def _handle_drawn_card_action(state: EngineState, action: Request) -> None:
+  card = state.drawn_card
+  if type(action) is SkipTurn:
+    state.hands[state.turn].append(card)
+    state.call_uno_player = None
+    state.drawn_card = None
+    _go_next_player(state)
+  elif action.card == card:
+    if type(action) is CallUNO:
+      state.call_uno_player = None
+    state.drawn_card = None
+    _play_card(state, card)
+  else:
+    state.decision = GetUserInput(state.decision.request_types, for_drawn_card=True, for_invalid_card=True)
+
+def _handle_bluff(state: EngineState, call_bluff: bool) -> None:
+  # we're guilty, the player who put down the +4 draws
+  if call_bluff and state.has_other_options:
+    _go_prev_player(state)
+    for _ in range(4):
+      _deal_card(state, state.turn)
+  # failed bluff
+  elif call_bluff:
+    for _ in range(6):
+      _deal_card(state, state.turn)
+  # no bluff called
+  else:
+    for _ in range(4):
+      _deal_card(state, state.turn)
+
+  _go_next_player(state)
+
+def _play_card(state: EngineState, card: Card) -> None:
+  card_type = type(card)
+
+  if card_type is PlusFour:
+    # check to see if we had other options than playing this card
+    mask = playable_mask(state.top_card(), state.color) & other_options_mask(state.color)
+    state.has_other_options = any(c.bit & mask for c in state.hands[state.turn])
+    state.discard_pile.append(card)
+    state.phase = EngineState.PLUS_FOUR_COLOR
+    state.decision = GetUserInput([SetColor])
+    return
+
+  state.discard_pile.append(card)
+
+  if card_type is Wild:
+    state.phase = EngineState.WILD_COLOR
+    state.decision = GetUserInput([SetColor])
+    return
+
+  state.color = card.color
+
+  if card_type is PlusTwo:
+    _go_next_player(state, is_turn_end=False)
+    _deal_card(state, state.turn)
+    _deal_card(state, state.turn)
+  elif card_type is Skip:
+    _go_next_player(state, is_turn_end=False)
+  elif card_type is Reverse:
+    state.dir = -state.dir
+
+  _go_next_player(state)
+
+
+############################ Helpers ############################
+
+def _go_next_player(state: EngineState, is_turn_end: bool = True) -> None:
+  state.turn = (state.turn + state.dir) % state.num_players
+  if is_turn_end:
+    _handle_turn_end(state)
+
+def _go_prev_player(state: EngineState) -> None:
+  state.turn = (state.turn - state.dir) % state.num_players
+
+def _handle_turn_end(state: EngineState) -> None:
+  state.num_turns += 1
+
+  for pos, hand in enumerate(state.hands):
+    if not hand:
+      _handle_round_end(state, pos)
+      return
+
+  request_list = [PlayCard, SkipTurn]
+  if state.call_uno_player is not None:
+    state.uno_fail_player = state.call_uno_player
+    state.call_uno_player = None
+    request_list.append(UNOFail)
+
+  if len(state.hands[state.turn]) == 2:
+    state.call_uno_player = state.turn
+    request_list.append(CallUNO)
+
+  state.phase = EngineState.TURN
+  state.decision = GetUserInput(request_list)
+
+def _handle_round_end(state: EngineState, round_winner: int) -> None:
+  state.scores[round_winner] += state.round_score(round_winner)
+
+  for pos, score in enumerate(state.scores):
+    if score >= state.end_score:
+      state.phase = EngineState.GAME_OVER
+      state.decision = GameOver(state.player(pos))
+      return
+
+  state.phase = EngineState.ROUND_OVER
+  state.decision = RoundOver(state.player(round_winner))
+
+def _deal_card(state: EngineState, pos: int) -> None:
+  if (card := _draw(state)) is not None:
+    state.hands[pos].append(card)
+
+# takes the top card of the draw pile, reshuffling the discard pile back in when it runs out
+def _draw(state: EngineState) -> Optional[Card]:
+  if not state.draw_pile:
+    if len(state.discard_pile) <= 1:
+      return None
+    state.draw_pile = state.discard_pile[:-1]
+    state.discard_pile = state.discard_pile[-1:]
+    _shuffle(state, state.draw_pile)
+  return state.draw_pile.pop()
+
+# shuffles are derived from the seed so that step stays a pure function
+def _shuffle(state: EngineState, cards: list[Card]) -> None:
+  random.Random(state.seed * 1_000_003 + state.num_shuffles).shuffle(cards)
+  state.num_shuffles += 1
@@ -0,0 +1,266 @@
+'''
+Append-only log of every request that reaches the state, one file per game.
+
+Each event is a one byte type code followed by its fields:
+ * cards are their card_id as a u8, or 0xff followed by type, color and number for cards
+   that aren't in CARDS (0xff stands in for None)
+ * DealtCard is the card followed by the number of cards recycled from the discard pile (u8)
+ * Reset is num_players (u8), hand_size (u8), end_score (u32)
+ * SetColor is the color as a u8, 0xff for None
+ * CorrectedState is a u16 length followed by the json of the correction
+
+Next to each game file is a .snap file of (event index, byte offset, length, pickled UNO.save_state())
+records. They are taken from the real state, on its own thread right after it handles an event
+(UNO.on_handled), whenever it isn't waiting in the middle of a sequence and enough events have gone
+by. Replaying loads the last snapshot at or before the event we want and runs the rest of the events
+through UNO.handle_request.
+
+python -m uno.event_log path/to/game.unolog [num_events]
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from typing import Iterator, Optional
+from collections import deque
+from queue import Queue
+from threading import Lock
+import datetime
+import json
+import os
+import pickle
+import struct
+import time
+
+from uno.card import Card, Color, CARDS, NUM_CARD_KINDS
+from uno.card import Number, PlusTwo, Skip, Reverse, Wild, PlusFour
+from uno.uno import UNO
+from uno.requests import *
+
+EVENT_TYPES = [Reset, RoundReset, PlayCard, CallUNO, DealtCard, SkipTurn, SetColor, Bluff, UNOFail, CorrectedState]
+_EVENT_CODES = {event_type: code for code, event_type in enumerate(EVENT_TYPES)}
+
+CARD_TYPES = [Number, PlusTwo, Skip, Reverse, Wild, PlusFour]
+_CARD_TYPE_CODES = {card_type: code for code, card_type in enumerate(CARD_TYPES)}
+ESCAPE = 0xff
+
+_RESET = struct.Struct('<BBI')
+_SNAPSHOT = struct.Struct('<IQI')
+
+
+# the replicas don't have anyone to talk to
+class NullQueue:
+  def put(self, request: Request) -> None:
+    pass
+
+
+############################ Encoding ############################
+
+def is_event(request: Request) -> bool:
+  return type(request) in _EVENT_CODES
+
+def encode_event(request: Request) -> bytes:
+  out = bytearray([_EVENT_CODES[type(request)]])
+  if type(request) is Reset:
+    out += _RESET.pack(request.num_players, request.hand_size, request.end_score)
+  elif type(request) in [PlayCard, CallUNO]:
+    out += _encode_card(request.card)
+    out.append(request.for_drawn_card)
+  elif type(request) is DealtCard:
+    out += _encode_card(request.card)
+    out.append(request.num_recycled)
+  elif type(request) is SkipTurn:
+    out.append(request.for_drawn_card)
+  elif type(request) is SetColor:
+    out.append(request.color if request.color is not None else ESCAPE)
+  elif type(request) is Bluff:
+    out.append(request.is_bluff)
+  elif type(request) is CorrectedState:
+    data = json.dumps(request.state_update).encode('utf-8')
+    out += struct.pack('<H', len(data)) + data
+  return bytes(out)
+
+def _encode_card(card: Card) -> bytes:
+  if card.card_id < NUM_CARD_KINDS:
+    return bytes([card.card_id])
+  return bytes([ESCAPE, _CARD_TYPE_CODES[card.type],
+                card.color if card.color is not None else ESCAPE,
+                card.number if card.number is not None else ESCAPE])
+
+# yields the byte offset and request of every event in data, starting at offset
+def decode_events(data: bytes, offset: int = 0) -> Iterator[tuple[int, Request]]:
+  while offset < len(data):
+    start = offset
+    event_type = EVENT_TYPES[data[offset]]
+    offset += 1
+
+    if event_type is Reset:
+      request = Reset(*_RESET.unpack_from(data, offset))
+      offset += _RESET.size
+    elif event_type in [PlayCard, CallUNO]:
+      card, offset = _decode_card(data, offset)
+      request = event_type(card, for_drawn_card=bool(data[offset]))
+      offset += 1
+    elif event_type is DealtCard:
+      card, offset = _decode_card(data, offset)
+      request = DealtCard(card, None, data[offset])
+      offset += 1
+    elif event_type is SkipTurn:
+      request = SkipTurn(for_drawn_card=bool(data[offset]))
+      offset += 1
+    elif event_type is SetColor:
+      request = SetColor(Color(data[offset]) if data[offset] != ESCAPE else None)
+      offset += 1
+    elif event_type is Bluff:
+      request = Bluff(bool(data[offset]))
+      offset += 1
+    elif event_type is CorrectedState:
+      length, = struct.unpack_from('<H', data, offset)
+      request = CorrectedState(json.loads(data[offset + 2:offset + 2 + length].decode('utf-8')))
+      offset += 2 + length
+    else:
+      request = event_type()
+
+    yield start, request
+
+def _decode_card(data: bytes, offset: int) -> tuple[Card, int]:
+  if data[offset] != ESCAPE:
+    return CARDS[data[offset]], offset + 1
+  card_type, color, number = data[offset + 1:offset + 4]
+  card = CARD_TYPES[card_type](Color(color) if color != ESCAPE else None, number if number != ESCAPE else None)
+  return card, offset + 4
+
+
+############################ Writing ############################
+
+class EventLog:
+  # least number of events between two snapshots
+  SNAPSHOT_INTERVAL = 64
+
+  def __init__(self, directory: str, table_id: int = 0):
+    self.directory = directory
+    self.table_id = table_id
+    os.makedirs(directory, exist_ok=True)
+
+    self.path: Optional[str] = None
+    self._events = None
+    self._snapshots = None
+    self._num_games = 0
+
+    self._num_events = 0
+    self._offset = 0
+    self._last_snapshot = 0
+
+    # (request, event index after it, byte offset after it) of every recorded event the state hasn't handled yet
+    self._unhandled: deque[tuple[Request, int, int]] = deque()
+    # events are recorded on the manager's thread and handled on the state's
+    self._lock = Lock()
+
+  def record(self, request: Request) -> None:
+    if not is_event(request):
+      return
+
+    with self._lock:
+      # every game gets its own file
+      if type(request) is Reset:
+        self._start_game()
+      elif self._events is None:
+        return
+
+      data = encode_event(request)
+      self._events.write(data)
+      self._offset += len(data)
+      self._num_events += 1
+      self._unhandled.append((request, self._num_events, self._offset))
+
+  # called by the state (on its own thread) after it handles a request, see UNO.on_handled
+  def handled(self, state: UNO, request: Request) -> None:
+    with self._lock:
+      # anything else is from before a reset, or never recorded
+      if not self._unhandled or self._unhandled[0][0] is not request:
+        return
+      _, num_events, offset = self._unhandled.popleft()
+
+      if num_events - self._last_snapshot >= EventLog.SNAPSHOT_INTERVAL and state.is_quiescent():
+        data = pickle.dumps(state.save_state(), protocol=pickle.HIGHEST_PROTOCOL)
+        self._snapshots.write(_SNAPSHOT.pack(num_events, offset, len(data)) + data)
+        self._last_snapshot = num_events
+
+  def close(self) -> None:
+    with self._lock:
+      self._close()
+
+  def _close(self) -> None:
+    if self._events is not None:
+      self._events.close()
+      self._snapshots.close()
+      self._events = self._snapshots = None
+
+  def _start_game(self) -> None:
+    self._close()
+    self._num_games += 1
+    date_time = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    self.path = os.path.join(self.directory, f'game_{date_time}_table{self.table_id}_{self._num_games}.unolog')
+
+    # unbuffered, so a crash loses at most the event being written
+    self._events = open(self.path, 'wb', buffering=0)
+    self._snapshots = open(self.path + '.snap', 'wb', buffering=0)
+
+    self._num_events = 0
+    self._offset = 0
+    self._last_snapshot = 0
+    self._unhandled.clear()
+
+
+############################ Replay ############################
+
+# the (event index, byte offset, saved state) of every snapshot of a game
+def read_snapshots(path: str) -> list[tuple[int, int, dict]]:
+  snapshots = []
+  if not os.path.exists(path + '.snap'):
+    return snapshots
+
+  with open(path + '.snap', 'rb') as f:
+    data = f.read()
+
+  offset = 0
+  while offset + _SNAPSHOT.size <= len(data):
+    num_events, event_offset, length = _SNAPSHOT.unpack_from(data, offset)
+    offset += _SNAPSHOT.size
+    # a crash can leave a partial snapshot at the end
+    if offset + length > len(data):
+      break
+    snapshots.append((num_events, event_offset, pickle.loads(data[offset:offset + length])))
+    offset += length
+  return snapshots
+
+# rebuilds the state after the first num_events events of a game (all of them by default)
+def replay(path: str, num_events: Optional[int] = None) -> UNO:
+  with open(path, 'rb') as f:
+    data = f.read()
+
+  state = UNO(Queue(), NullQueue())
+  start_event, offset = 0, 0
+  for snapshot_events, snapshot_offset, saved in reversed(read_snapshots(path)):
+    if num_events is None or snapshot_events <= num_events:
+      state.load_state(saved)
+      start_event, offset = snapshot_events, snapshot_offset
+      break
+
+  for event_idx, (_, request) in enumerate(decode_events(data, offset), start_event):
+    if num_events is not None and event_idx >= num_events:
+      break
+    state.handle_request(request)
+  return state
+
+
+if __name__ == '__main__':
+  import sys
+
+  start = time.perf_counter()
+  state = replay(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else None)
+  elapsed = time.perf_counter() - start
+
+  print(state)
+  print(f'Scores: {[player.score for player in state.players]}')
+  print(f'Replayed in {elapsed * 1000:.2f} ms')
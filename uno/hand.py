@@ -0,0 +1,89 @@
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from typing import Iterable, Iterator, Optional
+from bisect import bisect_left, bisect_right
+from operator import attrgetter
+
+from uno.card import Card
+
+# a player's cards, always sorted by card color, then card type, then card number
+#
+# finding a card's place is a binary search, but add and remove still shift the lists, so they
+# are O(n). a hand is at most a deck's worth of pointers, shifting that is a single memmove that
+# costs less than the search itself, and a tree or skip list would make iterating and indexing
+# (which the displayers do all the time) slower
+class Hand:
+  def __init__(self, cards: Iterable[Card] = ()):
+    self._cards: list[Card] = sorted(cards, key=attrgetter('sort_key'))
+    self._keys: list[tuple] = [card.sort_key for card in self._cards]
+
+    # how many of each card kind (by card_id) we hold, and the set of kinds we hold as a bitmask
+    self.kind_counts: dict[int, int] = {}
+    self.mask = 0
+    for card in self._cards:
+      self._count(card)
+
+    # immutable copy of the cards, shared by snapshots until the hand changes
+    self._snapshot: Optional[tuple[Card, ...]] = None
+
+  def add(self, card: Card) -> None:
+    idx = bisect_right(self._keys, card.sort_key)
+    self._keys.insert(idx, card.sort_key)
+    self._cards.insert(idx, card)
+    self._count(card)
+
+  def remove(self, card: Card) -> None:
+    if not self.mask & card.bit:
+      raise ValueError(f'{card} is not in the hand')
+    # cards are interned, so the first card with a matching key is the card
+    idx = bisect_left(self._keys, card.sort_key)
+    del self._keys[idx]
+    del self._cards[idx]
+    self._uncount(card)
+
+  # swaps out the card at idx and moves the new card to its sorted position
+  def replace(self, idx: int, card: Card) -> None:
+    self.remove(self._cards[idx])
+    self.add(card)
+
+  def snapshot(self) -> tuple[Card, ...]:
+    if self._snapshot is None:
+      self._snapshot = tuple(self._cards)
+    return self._snapshot
+
+  def count(self, card: Card) -> int:
+    return self.kind_counts.get(card.card_id, 0)
+
+  def _count(self, card: Card) -> None:
+    self._snapshot = None
+    self.kind_counts[card.card_id] = self.kind_counts.get(card.card_id, 0) + 1
+    self.mask |= card.bit
+
+  def _uncount(self, card: Card) -> None:
+    self._snapshot = None
+    if (count := self.kind_counts[card.card_id] - 1) > 0:
+      self.kind_counts[card.card_id] = count
+    else:
+      del self.kind_counts[card.card_id]
+      self.mask &= ~card.bit
+
+  def __contains__(self, card: Card) -> bool:
+    return bool(self.mask & card.bit)
+
+  def __iter__(self) -> Iterator[Card]:
+    return iter(self._cards)
+
+  def __len__(self) -> int:
+    return len(self._cards)
+
+  def __getitem__(self, idx):
+    return self._cards[idx]
+
+  def __eq__(self, other) -> bool:
+    if isinstance(other, Hand):
+      return self._cards == other._cards
+    return self._cards == other
+
+  def __repr__(self) -> str:
+    return repr(self._cards)
@@ -0,0 +1,190 @@
+'''
+Event driven matrix keypad.
+
+While idle every column is driven high, so pressing any key raises its row. Rows are
+watched for edges instead of being polled: on a rising edge the columns are driven one at
+a time to find which key it was, then they all go back high. Bounces are filtered with the
+edge timestamps, any edge within DEBOUNCE of the last accepted edge on the same row is
+ignored (that also swallows the edges the column scan itself causes). A press is reported
+on its first edge, so nothing waits for the key to be released.
+
+The GPIO access is behind a backend, so the same keypad runs on the Pi (GpiodBackend) or
+fully in memory (SimulatedGpioBackend) for tests and benchmarks.
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from typing import Optional
+from collections import deque
+from queue import Queue, Empty
+from threading import Thread, Condition
+import time
+
+
+class GpioBackend:
+  # blocks until at least one row changes or timeout passes, returns (row, is_rising, timestamp) edges in order
+  def wait_edges(self, timeout: Optional[float]) -> list[tuple[int, bool, float]]:
+    raise NotImplementedError
+
+  # the column of the key that connects to row, None if it was let go before we got to it
+  def scan_columns(self, row: int) -> Optional[int]:
+    raise NotImplementedError
+
+  def set_led(self, value: bool) -> None:
+    pass
+
+
+# libgpiod (v1 bindings), the rows are requested for edge events
+class GpiodBackend(GpioBackend):
+  def __init__(self, chip_name: str, row_pins: list[tuple[str, int]], col_pins: list[tuple[str, int]], led_pin: Optional[tuple[str, int]] = None):
+    import gpiod
+    self._gpiod = gpiod
+
+    chip = gpiod.Chip(chip_name)
+    self.row_lines = []
+    for (consumer, pin) in row_pins:
+      self.row_lines.append(chip.get_line(pin))
+      self.row_lines[-1].request(consumer=consumer, type=gpiod.LINE_REQ_EV_BOTH_EDGES, flags=gpiod.LINE_REQ_FLAG_BIAS_PULL_DOWN)
+    self._row_of_pin = {pin: row for row, (_, pin) in enumerate(row_pins)}
+    self._rows = gpiod.LineBulk(self.row_lines)
+
+    self.col_lines = []
+    for (consumer, pin) in col_pins:
+      self.col_lines.append(chip.get_line(pin))
+      self.col_lines[-1].request(consumer=consumer, type=gpiod.LINE_REQ_DIR_OUT)
+      self.col_lines[-1].set_value(1)
+
+    self.led_line = None
+    if led_pin is not None:
+      self.led_line = chip.get_line(led_pin[1])
+      self.led_line.request(consumer=led_pin[0], type=gpiod.LINE_REQ_DIR_OUT)
+
+  def wait_edges(self, timeout: Optional[float]) -> list[tuple[int, bool, float]]:
+    # the kernel wait needs a timeout, waking up once a second costs nothing
+    timeout = 1.0 if timeout is None else timeout
+    ready = self._rows.event_wait(sec=int(timeout), nsec=int((timeout % 1) * 1e9))
+    if ready is None:
+      return []
+
+    edges = []
+    for line in ready:
+      for event in line.event_read_multiple():
+        edges.append((self._row_of_pin[line.offset()], event.type == self._gpiod.LineEvent.RISING_EDGE, event.sec + event.nsec * 1e-9))
+    edges.sort(key=lambda edge: edge[2])
+    return edges
+
+  def scan_columns(self, row: int) -> Optional[int]:
+    for col_line in self.col_lines:
+      col_line.set_value(0)
+    try:
+      for col, col_line in enumerate(self.col_lines):
+        col_line.set_value(1)
+        is_down = self.row_lines[row].get_value() == 1
+        col_line.set_value(0)
+        if is_down:
+          return col
+      return None
+    finally:
+      # back to idle, every key can raise its row again
+      for col_line in self.col_lines:
+        col_line.set_value(1)
+
+  def set_led(self, value: bool) -> None:
+    if self.led_line is not None:
+      self.led_line.set_value(int(value))
+
+
+# an in memory keypad, keys are pressed and released from code (with optional contact bounce)
+class SimulatedGpioBackend(GpioBackend):
+  def __init__(self, num_rows: int = 4, num_cols: int = 3):
+    self.num_rows = num_rows
+    self.num_cols = num_cols
+    self.down: set[tuple[int, int]] = set()
+    self.led = False
+
+    self._edges: deque[tuple[int, bool, float]] = deque()
+    self._cond = Condition()
+
+  def press(self, row: int, col: int, bounces: int = 0) -> None:
+    with self._cond:
+      # a bouncing contact closes, opens and closes again a few times
+      for _ in range(bounces):
+        self._edge(row, True)
+        self._edge(row, False)
+      self.down.add((row, col))
+      self._edge(row, True)
+
+  def release(self, row: int, col: int, bounces: int = 0) -> None:
+    with self._cond:
+      self.down.discard((row, col))
+      for _ in range(bounces):
+        self._edge(row, False)
+        self._edge(row, True)
+      self._edge(row, False)
+
+  def wait_edges(self, timeout: Optional[float]) -> list[tuple[int, bool, float]]:
+    with self._cond:
+      if not self._edges:
+        self._cond.wait(timeout)
+      edges = list(self._edges)
+      self._edges.clear()
+      return edges
+
+  def scan_columns(self, row: int) -> Optional[int]:
+    with self._cond:
+      for col in range(self.num_cols):
+        if (row, col) in self.down:
+          return col
+      return None
+
+  def set_led(self, value: bool) -> None:
+    self.led = value
+
+  def _edge(self, row: int, is_rising: bool) -> None:
+    self._edges.append((row, is_rising, time.monotonic()))
+    self._cond.notify()
+
+
+class Keypad:
+  # seconds after an accepted edge that the row is ignored for
+  DEBOUNCE = 0.02
+
+  def __init__(self, backend: GpioBackend, debounce: float = DEBOUNCE):
+    self.backend = backend
+    self.debounce = debounce
+
+    # (row, col) of every accepted press, in order
+    self.presses: Queue[tuple[int, int]] = Queue()
+    self.num_bounces = 0
+    self._last_edge: dict[int, float] = {}
+
+    self._thread = Thread(target=self._watch, name='Keypad', daemon=True)
+    self._thread.start()
+
+  # blocks until a key is pressed (or timeout passes), returns (row, col)
+  def read(self, timeout: Optional[float] = None) -> Optional[tuple[int, int]]:
+    try:
+      return self.presses.get(timeout=timeout)
+    except Empty:
+      return None
+
+  # drops presses nobody picked up, so an old press can't answer a new question
+  def clear(self) -> None:
+    while not self.presses.empty():
+      self.presses.get()
+
+  def _watch(self) -> None:
+    while True:
+      for row, is_rising, timestamp in self.backend.wait_edges(None):
+        self.handle_edge(row, is_rising, timestamp)
+
+  def handle_edge(self, row: int, is_rising: bool, timestamp: float) -> None:
+    last_edge = self._last_edge.get(row)
+    if last_edge is not None and timestamp - last_edge < self.debounce:
+      self.num_bounces += 1
+      return
+    self._last_edge[row] = timestamp
+
+    if is_rising and (col := self.backend.scan_columns(row)) is not None:
+      self.presses.put((row, col))
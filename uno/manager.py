@@ -4,8 +4,13 @@ Houses the controller and displayer(s)
 
 from __future__ import annotations
 
-from typing import Optional, Collection
+from typing import Optional, Collection, Callable
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import logging
+import threading
+import time
 import datetime
 import os
 
@@ -14,7 +19,12 @@ from uno.displayer import Displayer
 
 from queue import Queue
 from uno.uno import UNO
+from uno.coalescer import UpdateCoalescer
+from uno.queues import LoopQueue, LaneQueue, Mailbox
+from uno.event_log import EventLog
 from uno.requests import *
+from uno import tracing
+from uno import profiling
 
 from typing import Collection
 
@@ -26,34 +36,80 @@ class Manager:
   TO_STATE = [PlayCard, DealtCard, SkipTurn, SetColor, Bluff, CallUNO, UNOFail, CorrectedState]
   TO_DISPLAYERS = [CurrentState]
 
-  def __init__(self, controller_type: type[Controller], displayer_types: Collection[type[Displayer]], logger: logging.Logger, url: str) -> None:
+  # these skip ahead of everything else waiting in the manager and controller queues.
+  # GameOver and RoundOver stay in order instead: skipping ahead would throw away the last state
+  # of the round (the winning play, which the coalescer sends right before them) and let displayers
+  # and the controller see the end before the play that ended it. they are barriers in the queues
+  # (see LaneQueue.BARRIERS), and handle_game_over clears whatever is behind them
+  CONTROL = [Reset, RoundReset]
+  CONTROLLER_CONTROL = [ControllerReset, ControllerRoundReset]
+
+  def __init__(self, controller_type: type[Controller], displayer_types: Collection[type[Displayer]], logger: logging.Logger, url: str,
+               update_window: Optional[float] = 0.016, event_log_dir: Optional[str] = None,
+               seed: Optional[int] = None, script_path: Optional[str] = None, table_id: int = 0) -> None:
+    self.table_id = table_id
+
     # make all of the queues for communication
-    self.manager_queue = Queue()
-    self.controller_queue = Queue()
+    self.manager_queue = self.make_manager_queue()
+    self.controller_queue = LaneQueue(Manager.CONTROLLER_CONTROL)
     self.state_queue = Queue()
-    self.displayer_queues = [Queue() for _ in range(len(displayer_types))]
+    self.displayer_queues = [Mailbox() for _ in range(len(displayer_types))]
     self.logger = logger
 
-    self.controller = controller_type(self.controller_queue, self.manager_queue)
+    # seconds from a reset being queued to the state being reset, for the most recent resets
+    self.reset_latencies: deque[float] = deque(maxlen=100)
+
+    # everything the state is sent, so a game can be replayed later
+    self.event_log = EventLog(event_log_dir, table_id) if event_log_dir is not None else None
+
+    if controller_type.__name__ == 'ScriptedController':
+      self.controller = controller_type(self.controller_queue, self.manager_queue, script_path, seed)
+    elif controller_type.__name__ == 'TerminalController':
+      self.controller = controller_type(self.controller_queue, self.manager_queue, seed)
+    else:
+      self.controller = controller_type(self.controller_queue, self.manager_queue)
     self.logger.info(f'Initialized {controller_type.__name__}')
-    self.state = UNO(self.state_queue, self.manager_queue) # TODO: change this
+    # bursts of display updates from the state are merged before they reach the manager
+    self.update_coalescer = self.make_update_coalescer(update_window)
+    self.state = UNO(self.state_queue, self.update_coalescer) # TODO: change this
+    if self.event_log is not None:
+      # snapshots are taken from the state itself, on whichever thread runs it
+      self.state.on_handled = self.event_log.handled
     self.logger.info(f'Initialized UNO state')
     # self.displayers = [displayer_type(displayer_queue, self.manager_queue) for displayer_type, displayer_queue in zip(displayer_types, self.displayer_queues)] # TODO: change this
     self.displayers = []
     for displayer_type, displayer_queue in zip(displayer_types, self.displayer_queues):
       if displayer_type.__name__ == 'WebsiteDisplayer':
-        self.displayers.append(displayer_type(displayer_queue, self.manager_queue, url))
+        self.displayers.append(displayer_type(displayer_queue, self.manager_queue, url, table_id))
       else:
         self.displayers.append(displayer_type(displayer_queue, self.manager_queue))
     
     self.logger.info(f'Initialized {", ".join([displayer_type.__name__ for displayer_type in displayer_types])}')
 
+    # maps each request type to its handler, so routing a request is one lookup
+    self.routes: dict[type[Request], Callable[[Request], None]] = {
+      Reset: self.handle_reset,
+      RoundReset: self.handle_reset,
+      GameOver: self.handle_game_over,
+      RoundOver: self.handle_game_over,
+      **{request_type: self.send_to_controller for request_type in Manager.TO_CONTROLLER},
+      **{request_type: self.handle_state_request for request_type in Manager.TO_STATE},
+      **{request_type: self.send_to_displayers for request_type in Manager.TO_DISPLAYERS},
+    }
+
+  def make_manager_queue(self):
+    return LaneQueue(Manager.CONTROL)
+
+  def make_update_coalescer(self, update_window: Optional[float]) -> UpdateCoalescer:
+    return UpdateCoalescer(self.manager_queue, update_window)
+
   def clear_queues(self):
     # clear everyone's queues
     queues_to_clear = [self.manager_queue, self.controller_queue, self.state_queue]
     for queue in queues_to_clear:
       while not queue.empty():
         queue.get()
+    self.update_coalescer.clear()
 
   def reset_controller(self):
     self.controller.reset()
@@ -75,33 +131,141 @@ class Manager:
     self.logger.info('Started displayers')
 
     # main control flow loop
+    threading.current_thread().name = 'Manager'
     while True:
       request = self.manager_queue.get()
-      
+      tracing.hop(request, 'manager')
+
       self.logger.info(f'Manager received {request}')
+      self.route(request)
+
+  def route(self, request: Request) -> None:
+    request.table_id = self.table_id
+    if (handler := self.routes.get(type(request))) is not None:
+      handler(request)
+    else:
+      print('Unknown request in Manager!')
+
+  def handle_reset(self, request: Request) -> None:
+    # clearing the queues hands out (and throws away) other requests, which overwrites this
+    enqueue_time = self.manager_queue.last_enqueue_time
+    self.clear_queues()
+    self.reset_controller()
+    if self.event_log is not None: self.event_log.record(request)
+    self.reset_state(request)
+    self.reset_displayers()
+
+    latency = time.monotonic() - enqueue_time
+    self.reset_latencies.append(latency)
+    self.logger.info(f'{type(request).__name__} handled {latency * 1000:.2f} ms after it was queued')
+
+  def handle_game_over(self, request: Request) -> None:
+    self.clear_queues()
+    self.reset_controller()
+    self.send_to_displayers(request)
+
+    self.logger.info(f'Displayer mailboxes: {self.displayer_metrics()}')
+    self.logger.info(f'Request latencies:\n{tracing.report()}')
+
+  # depth and drop counts of each displayer's mailbox
+  def displayer_metrics(self) -> dict[str, dict]:
+    return {type(displayer).__name__: queue.metrics() for displayer, queue in zip(self.displayers, self.displayer_queues)}
+
+  def handle_state_request(self, request: Request) -> None:
+    if self.event_log is not None: self.event_log.record(request)
+    self.send_to_state(request)
+
+  def send_to_controller(self, request: Request) -> None:
+    self.controller_queue.put(request)
+
+  def send_to_state(self, request: Request) -> None:
+    self.state_queue.put(request)
+
+  def send_to_displayers(self, request: Request) -> None:
+    for displayer_queue in self.displayer_queues:
+      displayer_queue.put(request)
+
+
+# runs the state on one event loop instead of a thread, and feeds the displayers from it.
+# the controller keeps its threads since its handlers block on the hardware, and the displayers
+# block too (emitting to the website, drawing), so they are called on an executor, each one
+# a request at a time in order, and a slow displayer only falls behind in its mailbox
+class AsyncManager(Manager):
+  def __init__(self, controller_type: type[Controller], displayer_types: Collection[type[Displayer]], logger: logging.Logger, url: str,
+               update_window: Optional[float] = 0.016, event_log_dir: Optional[str] = None,
+               seed: Optional[int] = None, script_path: Optional[str] = None, table_id: int = 0,
+               loop: Optional[asyncio.AbstractEventLoop] = None, displayer_executor: Optional[ThreadPoolExecutor] = None) -> None:
+    # tables hosted in one process share a loop and an executor (see uno/tables.py)
+    self.loop = loop if loop is not None else asyncio.new_event_loop()
+    super().__init__(controller_type, displayer_types, logger, url, update_window, event_log_dir, seed, script_path, table_id)
+
+    # a table on its own gets a thread per displayer
+    if displayer_executor is None:
+      displayer_executor = ThreadPoolExecutor(max_workers=max(len(self.displayers), 1),
+                                              thread_name_prefix=f'AsyncManager {table_id} displayers')
+    self.displayer_executor = displayer_executor
+    # set when a displayer's mailbox has something new
+    self._displayer_wakeups = [asyncio.Event() for _ in self.displayers]
+    # the loop only keeps weak references to tasks
+    self._displayer_tasks: list[asyncio.Task] = []
+
+  def make_manager_queue(self):
+    return LoopQueue(self.loop)
+
+  def make_update_coalescer(self, update_window: Optional[float]) -> UpdateCoalescer:
+    return UpdateCoalescer(self.manager_queue, update_window, self.loop)
+
+  def clear_queues(self):
+    while not self.manager_queue.empty():
+      self.manager_queue.get_nowait()
+    while not self.controller_queue.empty():
+      self.controller_queue.get()
+    self.update_coalescer.clear()
+
+  # the state is called straight from the loop, so there is no queue to hand off to
+  def reset_state(self, request: Request):
+    tracing.hop(request, 'uno')
+    self.state.handle_request(request)
+
+  def send_to_state(self, request: Request) -> None:
+    tracing.hop(request, 'uno')
+    self.state.handle_request(request)
+
+  def send_to_displayers(self, request: Request) -> None:
+    for displayer_queue, wakeup in zip(self.displayer_queues, self._displayer_wakeups):
+      displayer_queue.put(request)
+      wakeup.set()
+
+  async def run_displayer(self, displayer: Displayer, displayer_queue: Mailbox, wakeup: asyncio.Event) -> None:
+    while True:
+      await wakeup.wait()
+      wakeup.clear()
+      # only this task takes from the mailbox, so it won't block
+      while not displayer_queue.empty():
+        request = displayer_queue.get()
+        await self.loop.run_in_executor(self.displayer_executor, displayer.handle_request, request)
+
+  def start(self):
+    self.start_controller()
+    self.loop.run_until_complete(self.run())
+
+  def start_controller(self):
+    self.controller.start()
+    self.logger.info('Started controller')
+
+  async def run(self):
+    # the state runs on the loop, so its sequences are suspended here
+    threading.current_thread().name = 'Manager'
+    profiling.track_suspended(self.state, lambda: self.state._sequence, f'table {self.table_id}')
+
+    for displayer, displayer_queue, wakeup in zip(self.displayers, self.displayer_queues, self._displayer_wakeups):
+      self._displayer_tasks.append(self.loop.create_task(self.run_displayer(displayer, displayer_queue, wakeup)))
+
+    # main control flow loop
+    while True:
+      request = await self.manager_queue.get()
+      tracing.hop(request, 'manager')
+
+      self.logger.info(f'Manager received {request}')
+      self.route(request)
 
-      if type(request) in [Reset, RoundReset]:
-        self.clear_queues()
-        self.reset_controller()
-        self.reset_state(request)
-        self.reset_displayers()
-
-      elif type(request) in [GameOver, RoundOver]:
-        self.clear_queues()
-        self.reset_controller()
-        
-        for displayer_queue in self.displayer_queues:
-          displayer_queue.put(request)
-
-      elif type(request) in Manager.TO_CONTROLLER:
-        self.controller_queue.put(request)
-      elif type(request) in Manager.TO_STATE:
-        self.state_queue.put(request)
-      elif type(request) in Manager.TO_DISPLAYERS:
-        # if type(request) is CurrentState:
-        #   print(request.state.to_json())
-        for displayer_queue in self.displayer_queues:
-          displayer_queue.put(request)
-      else:
-        print('Unknown request in Manager!')
-      
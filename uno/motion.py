@@ -0,0 +1,74 @@
+'''
+Plans the dealer's rotations from seat to seat.
+
+UNO asks for one GoNextPlayer per seat it moves through (a skip is two, an UNO fail goes
+back and forth a whole lap). Instead of turning for each one, the planner only tracks
+which seat the dealer should face and turns once when a move is actually needed (before a
+deal, or once the requests stop coming), taking the shorter way round.
+
+Seat positions are absolute, seat k is round(k * STEPS_PER_REVOLUTION / num_players) steps
+from the origin, so the rounding of an uneven split never adds up over a game.
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from typing import Optional
+from threading import Lock
+
+
+class RotationPlanner:
+  # the stepper has 200 steps per revolution and is geared 4:1 to the dealer
+  STEPS_PER_REVOLUTION = 200 * 4
+
+  def __init__(self, steps_per_revolution: int = STEPS_PER_REVOLUTION):
+    self.steps_per_revolution = steps_per_revolution
+
+    # steps the motor has been told to go to, from where it started
+    self.position = 0
+    # the position of seat 0
+    self.origin = 0
+    self.seat = 0
+    self.num_players: Optional[int] = None
+
+    self.num_requested = 0
+    self.num_moves = 0
+    self._lock = Lock()
+
+  # a seat further in dir (1 or -1), nothing moves until flush
+  def rotate(self, dir: int, num_players: int) -> None:
+    with self._lock:
+      if num_players != self.num_players:
+        # the seats are laid out again from wherever the dealer is headed
+        self.origin = self.position
+        self.seat = 0
+        self.num_players = num_players
+      self.seat = (self.seat + dir) % num_players
+      self.num_requested += 1
+
+  @property
+  def has_pending(self) -> bool:
+    return self._steps_to_seat() != 0
+
+  # the steps to send to face the current seat (0 if already there), the move counts as made
+  def flush(self) -> int:
+    with self._lock:
+      steps = self._steps_to_seat()
+      self.position += steps
+      self.num_moves += steps != 0
+      return steps
+
+  # whatever the dealer is facing (or headed to) becomes seat 0, pending moves are dropped
+  def reset(self) -> None:
+    with self._lock:
+      self.origin = self.position
+      self.seat = 0
+      self.num_players = None
+
+  def _steps_to_seat(self) -> int:
+    if self.num_players is None:
+      return 0
+    target = self.origin + round(self.seat * self.steps_per_revolution / self.num_players)
+    # the shorter way round, half a turn goes forward
+    steps = (target - self.position) % self.steps_per_revolution
+    return steps - self.steps_per_revolution if steps > self.steps_per_revolution // 2 else steps
@@ -0,0 +1,112 @@
+'''
+Emulates motor_driver/motor_driver.ino on a pseudo-terminal, so the serial code can be
+run, tested and benchmarked without the board.
+
+Commands are a letter and an optional number, one per line, answered with one line each:
+ * d: deal a card, "t" if it went past the sensor, "f" otherwise
+ * u: push the card back up, "f"
+ * r<steps>: rotate by steps (negative goes the other way), "f"
+
+The delays are the ones in the sketch, scaled by time_scale (0 answers right away).
+
+python -m uno.motor_emulator [time_scale]
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from typing import Optional
+from threading import Thread
+import os
+import random
+import time
+import tty
+
+
+class MotorDriverEmulator:
+  # seconds each command takes on the board
+  DEAL_TIME = 0.7 + 0.7 + 0.3
+  UNDEAL_TIME = 0.5
+  # the stepper runs at 60 rpm with 200 steps per revolution
+  STEPS_PER_SECOND = 200
+
+  def __init__(self, time_scale: float = 1.0, deal_success_rate: float = 1.0, seed: Optional[int] = None):
+    self.time_scale = time_scale
+    self.deal_success_rate = deal_success_rate
+    self.rng = random.Random(seed)
+
+    # the controller opens the slave end like it would the board's /dev/ttyACM0
+    self._master_fd, self._slave_fd = os.openpty()
+    tty.setraw(self._slave_fd)
+    self.port = os.ttyname(self._slave_fd)
+
+    # where the stepper is, in steps from where it started
+    self.position = 0
+    self.num_dealt = 0
+    self.commands: list[str] = []
+
+    self._thread = Thread(target=self._run, name='MotorDriverEmulator', daemon=True)
+
+  def start(self) -> MotorDriverEmulator:
+    self._thread.start()
+    return self
+
+  def close(self) -> None:
+    os.close(self._master_fd)
+    os.close(self._slave_fd)
+
+  def _run(self) -> None:
+    buffer = b''
+    while True:
+      try:
+        data = os.read(self._master_fd, 1024)
+      except OSError:
+        return
+      if not data:
+        return
+
+      buffer += data
+      while b'\n' in buffer:
+        line, buffer = buffer.split(b'\n', 1)
+        answer = self.handle_command(line.decode('ascii').strip())
+        # Serial.println ends lines with \r\n
+        os.write(self._master_fd, f'{answer}\r\n'.encode('ascii'))
+
+  # does what the sketch does for one command, returns the line it answers with
+  def handle_command(self, line: str) -> str:
+    self.commands.append(line)
+    cmd, data = line[:1], line[1:]
+    dealt = False
+
+    if cmd == 'd':
+      self._delay(MotorDriverEmulator.DEAL_TIME)
+      dealt = self.rng.random() < self.deal_success_rate
+      self.num_dealt += dealt
+    elif cmd == 'u':
+      self._delay(MotorDriverEmulator.UNDEAL_TIME)
+    elif cmd == 'r':
+      # like String.toInt, anything that isn't a number is 0
+      try:
+        steps = int(data)
+      except ValueError:
+        steps = 0
+      self._delay(abs(steps) / MotorDriverEmulator.STEPS_PER_SECOND)
+      self.position += steps
+
+    return 't' if dealt else 'f'
+
+  def _delay(self, seconds: float) -> None:
+    if self.time_scale > 0:
+      time.sleep(seconds * self.time_scale)
+
+
+if __name__ == '__main__':
+  import sys
+
+  emulator = MotorDriverEmulator(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0).start()
+  print(f'Emulating the motor driver on {emulator.port}')
+  try:
+    while True:
+      time.sleep(1)
+  except KeyboardInterrupt:
+    print(f'Handled {len(emulator.commands)} commands, dealt {emulator.num_dealt} cards, at position {emulator.position}')
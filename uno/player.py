@@ -4,6 +4,8 @@ from __future__ import annotations
 from typing import Collection, Optional
 
 from uno.card import Color, Card
+from uno.card import playable_mask, other_options_mask
+from uno.hand import Hand
 
 # only import what we need if we are doing type checking
 from typing import TYPE_CHECKING
@@ -13,40 +15,63 @@ if TYPE_CHECKING:
 
 class Player:
   def __init__(self, hand: Collection[Card], position: int, name: Optional[str] = None):
-    self.hand = hand
+    # the hand keeps itself sorted
+    self.hand = Hand(hand)
     # used for holding the temporary card they could play when drawing a card
     self.drawn_card: Optional[Card] = None
     self.position = position
     self.name = name if name is not None else f'Player {position}'
     self.score = 0
-
-    # sort the hand
-    self._sort_hand()
+    self._snapshot: Optional[PlayerSnapshot] = None
 
   def receive_card(self, card : Card, state: UNO) -> None:
-    self.hand.append(card)
-
-    # keep hand sorted
-    self._sort_hand()
+    self.hand.add(card)
 
     state._send_update_to_displayer()
 
   def can_play(self, top_card: Card, deck_color: Color) -> bool:
-    return self.get_playable_cards(top_card, deck_color) == []
+    return not self.has_playable_card(top_card, deck_color)
+
+  def has_card(self, card: Card) -> bool:
+    return card in self.hand
+
+  # whether card is in our hand and can be played right now
+  def can_play_card(self, card: Card, top_card: Card, deck_color: Color) -> bool:
+    return bool(self.hand.mask & card.bit & playable_mask(top_card, deck_color))
+
+  def has_playable_card(self, top_card: Card, deck_color: Color) -> bool:
+    return bool(self.hand.mask & playable_mask(top_card, deck_color))
+
+  # whether we could have played something other than a +4, see PlusFour.play_card
+  def has_other_options(self, top_card: Card, deck_color: Color) -> bool:
+    return bool(self.hand.mask & playable_mask(top_card, deck_color) & other_options_mask(deck_color))
   
   def get_playable_cards(self, top_card: Card, deck_color: Color):
-    return list(filter(lambda c: c.is_playable(top_card, deck_color), self.hand))
+    mask = playable_mask(top_card, deck_color)
+    return [card for card in self.hand if card.bit & mask]
 
   def remove_card(self, card: Card, state: UNO) -> None:
     self.hand.remove(card)
 
-    self._sort_hand()
-
     state._send_update_to_displayer()
 
+  # swaps out the card at idx, used for state corrections
+  def replace_card(self, idx: int, card: Card) -> None:
+    self.hand.replace(idx, card)
+
   def clear_hand(self):
     self.drawn_card = None
-    self.hand = []
+    self.hand = Hand()
+
+  # immutable copy of the player, reused for as long as nothing about the player changes
+  def snapshot(self) -> PlayerSnapshot:
+    hand = self.hand.snapshot()
+    snapshot = self._snapshot
+    if snapshot is None or snapshot.hand is not hand or snapshot.drawn_card is not self.drawn_card \
+       or snapshot.score != self.score or snapshot.name != self.name:
+      snapshot = PlayerSnapshot(hand, self.drawn_card, self.position, self.name, self.score)
+      self._snapshot = snapshot
+    return snapshot
 
   def to_json(self):
     obj = {
@@ -58,17 +83,35 @@ class Player:
     }
     return obj
   
-  def _sort_hand(self) -> None:
-    # sort by card color, then card type, then card number
-    self.hand.sort(key=lambda c: (
-                   c.color if c.color is not None else -1, 
-                   c.type.__name__, 
-                   c.number if c.number is not None else -1))
-  
   @staticmethod
   def _hand_to_str(hand) -> str:
     return '\n'.join(map(lambda x: f'{x[0]}: {x[1]}', enumerate(hand)))
 
   def __repr__(self):
     # join the list of cards into a single string
-    return self.name + '\n' + Player._hand_to_str(self.hand)
\ No newline at end of file
+    return self.name + '\n' + Player._hand_to_str(self.hand)
+
+
+# what the displayers see of a player, never changes once created
+class PlayerSnapshot:
+  __slots__ = ('hand', 'drawn_card', 'position', 'name', 'score')
+
+  def __init__(self, hand: tuple[Card, ...], drawn_card: Optional[Card], position: int, name: str, score: int):
+    self.hand = hand
+    self.drawn_card = drawn_card
+    self.position = position
+    self.name = name
+    self.score = score
+
+  # snapshots are immutable, so copies can share them
+  def __copy__(self) -> PlayerSnapshot:
+    return self
+
+  def __deepcopy__(self, memo) -> PlayerSnapshot:
+    return self
+
+  def to_json(self):
+    return Player.to_json(self)
+
+  def __repr__(self):
+    return Player.__repr__(self)
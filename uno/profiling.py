@@ -0,0 +1,166 @@
+'''
+Sampling profiler for live games, so slowdowns can be looked at under real play.
+
+A background thread looks at the stack of every other thread (sys._current_frames) a
+fixed number of times a second and counts each stack two ways:
+ * wall: one per sample, so time spent blocked (motor answers, keypad_read, queue gets) shows up
+ * cpu: weighted by the cpu time the thread used since the last sample, so only real work shows up
+
+UNO sequences are suspended generators while they wait on a reply, so they aren't on any
+thread's stack. Whoever runs them can register where their suspended work is (track_suspended),
+and that gets added on top of the thread's stack, which attributes the wait to transaction_sync.
+A thread can run several owners (every table on one event loop), the sample is then counted once
+for each owner that is waiting, with the cpu time split between them.
+
+Both profiles are written as folded stacks (thread;frame;frame count), which flamegraph.pl,
+inferno and speedscope can load. Nothing is written until the profile stops.
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from typing import Callable, Generator, Optional
+from collections import Counter
+from threading import Thread, Event, Lock
+from types import CodeType, FrameType
+import os
+import sys
+import threading
+import time
+
+# deepest stack we look at, keeps a runaway recursion from slowing down sampling
+MAX_DEPTH = 128
+
+# thread ident -> owner -> (label, function that returns the generator the owner has suspended, if any)
+_suspended: dict[int, dict[object, tuple[str, Callable[[], Optional[Generator]]]]] = {}
+
+
+# register where owner keeps its suspended work, owner runs on the calling thread
+def track_suspended(owner: object, get_generator: Callable[[], Optional[Generator]], label: Optional[str] = None) -> None:
+  label = label if label is not None else type(owner).__name__
+  _suspended.setdefault(threading.get_ident(), {})[owner] = (label, get_generator)
+
+
+class SamplingProfiler:
+  def __init__(self, path: str, interval: float = 0.01, delay: float = 0.0, duration: Optional[float] = None):
+    # the profiles go to path.wall.folded and path.cpu.folded
+    self.path = path
+    self.interval = interval
+    self.delay = delay
+    self.duration = duration
+
+    self.wall: Counter[str] = Counter()
+    # microseconds of cpu time per stack
+    self.cpu: Counter[str] = Counter()
+    self.num_samples = 0
+
+    self._labels: dict[CodeType, str] = {}
+    self._last_cpu_times: dict[int, float] = {}
+    self._has_cpu_clocks = hasattr(time, 'pthread_getcpuclockid')
+    if not self._has_cpu_clocks:
+      print('WARNING: Per thread cpu clocks are not supported here, only writing the wall profile')
+
+    self._stop_event = Event()
+    self._written = False
+    self._lock = Lock()
+    self._thread = Thread(target=self._run, name='SamplingProfiler', daemon=True)
+
+  def start(self) -> None:
+    self._thread.start()
+
+  # stops sampling and writes the profiles, safe to call more than once
+  def stop(self) -> None:
+    self._stop_event.set()
+    if self._thread.is_alive() and self._thread is not threading.current_thread():
+      self._thread.join()
+    self.write()
+
+  def write(self) -> None:
+    with self._lock:
+      if self._written:
+        return
+      self._written = True
+
+    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+    for kind, stacks in [('wall', self.wall), ('cpu', self.cpu)]:
+      if kind == 'cpu' and not self._has_cpu_clocks:
+        continue
+      with open(f'{self.path}.{kind}.folded', 'w') as f:
+        for stack, num in stacks.most_common():
+          if num > 0:
+            f.write(f'{stack} {num}\n')
+    print(f'Wrote {self.num_samples} profile samples to {self.path}.*.folded')
+
+  def _run(self) -> None:
+    if self._stop_event.wait(self.delay):
+      return
+
+    end_time = time.monotonic() + self.duration if self.duration is not None else None
+    next_sample = time.monotonic()
+    while not self._stop_event.is_set():
+      self._sample()
+
+      if end_time is not None and time.monotonic() >= end_time:
+        break
+      # keep a steady rate even if a sample takes a while
+      next_sample += self.interval
+      self._stop_event.wait(max(next_sample - time.monotonic(), 0))
+
+    self.write()
+
+  def _sample(self) -> None:
+    self.num_samples += 1
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    own_ident = threading.get_ident()
+
+    for ident, frame in sys._current_frames().items():
+      if ident == own_ident:
+        continue
+
+      stacks = self._fold(names.get(ident, f'thread {ident}'), frame, ident)
+      cpu_delta = self._cpu_delta(ident) if self._has_cpu_clocks else 0
+      for stack in stacks:
+        self.wall[stack] += 1
+        if self._has_cpu_clocks:
+          self.cpu[stack] += cpu_delta // len(stacks)
+
+  # thread;outermost frame;...;innermost frame, once for every owner on the thread with suspended work
+  def _fold(self, thread_name: str, frame: FrameType, ident: int) -> list[str]:
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+      labels.append(self._label(frame.f_code))
+      frame = frame.f_back
+    labels.append(thread_name)
+    labels.reverse()
+
+    stacks = []
+    for owner_label, get_generator in list(_suspended.get(ident, {}).values()):
+      # a running generator is already on the stack
+      if (generator := get_generator()) is not None and not generator.gi_running:
+        stacks.append(';'.join(labels + self._suspended_labels(owner_label, generator)))
+    return stacks or [';'.join(labels)]
+
+  # a suspended generator and the ones it is yielding from, outermost first
+  def _suspended_labels(self, owner_label: str, generator: Generator) -> list[str]:
+    labels = [f'[suspended {owner_label}]']
+    while generator is not None and len(labels) < MAX_DEPTH:
+      if generator.gi_frame is None:
+        break
+      labels.append(self._label(generator.gi_code))
+      generator = getattr(generator, 'gi_yieldfrom', None)
+    return labels
+
+  def _label(self, code: CodeType) -> str:
+    if (label := self._labels.get(code)) is None:
+      label = self._labels[code] = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+    return label
+
+  # microseconds of cpu time the thread used since we last looked
+  def _cpu_delta(self, ident: int) -> int:
+    try:
+      cpu_time = time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (OSError, OverflowError):
+      return 0
+    last_cpu_time = self._last_cpu_times.get(ident, cpu_time)
+    self._last_cpu_times[ident] = cpu_time
+    return round((cpu_time - last_cpu_time) * 1e6)
@@ -0,0 +1,192 @@
+'''
+Queues that connect the components to the manager.
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from typing import Collection, Optional
+from collections import deque
+from queue import Empty
+from threading import Condition
+import asyncio
+import time
+
+from uno.requests import *
+
+
+# a blocking queue with two lanes: control requests (resets) jump ahead of the bulk
+# traffic and throw away whatever bulk traffic is still waiting, and a queued
+# CurrentState is dropped as soon as a newer one comes in (unless a round or game over is between them).
+# with a capacity, the oldest state is dropped to make room, never a round or game over
+class LaneQueue:
+  # the state queued before one of these is the last state of the round, so it has to be kept
+  BARRIERS = [GameOver, RoundOver]
+
+  def __init__(self, control_types: Collection[type[Request]], capacity: Optional[int] = None):
+    self.control_types = set(control_types)
+    self.capacity = capacity
+
+    # entries are [enqueue time, request], a dropped entry has its request set to None
+    self._control: deque[list] = deque()
+    self._bulk: deque[list] = deque()
+    self._num_bulk = 0
+    self._latest_state: Optional[list] = None
+    # with a capacity, the state entries in the order they came in, so the oldest can be dropped without a search
+    self._states: deque[list] = deque()
+
+    # when the last request we handed out was enqueued, for measuring latency
+    self.last_enqueue_time = 0.0
+    self.num_dropped = 0
+    self.max_depth = 0
+
+    self._cond = Condition()
+
+  def put(self, request: Request) -> None:
+    with self._cond:
+      entry = [time.monotonic(), request]
+      if type(request) in self.control_types:
+        self._clear_bulk()
+        self._control.append(entry)
+      else:
+        if type(request) is CurrentState and self._latest_state is not None:
+          # nobody needs to see the older state anymore
+          self.num_dropped += 1
+          if self._latest_state is self._bulk[-1]:
+            # nothing came in after it, so the new state takes its place
+            self._latest_state[:] = entry
+            self._cond.notify()
+            return
+          # something is queued behind it, so it is left as a hole that get skips. there is at most
+          # one hole per request queued after it
+          self._latest_state[1] = None
+          self._num_bulk -= 1
+
+        if self.capacity is not None and len(self._control) + self._num_bulk >= self.capacity:
+          self._drop_oldest_state()
+        if type(request) is CurrentState:
+          self._latest_state = entry
+          if self.capacity is not None:
+            self._states.append(entry)
+        elif type(request) in LaneQueue.BARRIERS:
+          self._latest_state = None
+        self._bulk.append(entry)
+        self._num_bulk += 1
+      self.max_depth = max(self.max_depth, len(self._control) + self._num_bulk)
+      self._cond.notify()
+
+  # like Queue.get, raises Empty if nothing comes in within timeout
+  def get(self, timeout: Optional[float] = None) -> Request:
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    with self._cond:
+      while True:
+        if self._control:
+          entry = self._control.popleft()
+        elif self._num_bulk:
+          entry = self._bulk.popleft()
+          if entry[1] is None:
+            continue
+          self._num_bulk -= 1
+          if entry is self._latest_state:
+            self._latest_state = None
+        else:
+          if deadline is None:
+            self._cond.wait()
+          elif (remaining := deadline - time.monotonic()) > 0:
+            self._cond.wait(remaining)
+          else:
+            raise Empty
+          continue
+
+        self.last_enqueue_time = entry[0]
+        request = entry[1]
+        if self._states:
+          # handed out, so the states lane can forget it
+          entry[1] = None
+          self._prune_states()
+        return request
+
+  def qsize(self) -> int:
+    with self._cond:
+      return len(self._control) + self._num_bulk
+
+  def empty(self) -> bool:
+    return self.qsize() == 0
+
+  def metrics(self) -> dict:
+    with self._cond:
+      return {'depth': len(self._control) + self._num_bulk, 'max_depth': self.max_depth, 'dropped': self.num_dropped}
+
+  # makes room by dropping the oldest state, nothing else is ever dropped for room, so with nothing but
+  # round and game overs (and requests for the state) waiting the queue goes over capacity
+  def _drop_oldest_state(self) -> None:
+    self._prune_states()
+    if not self._states:
+      return
+
+    entry = self._states.popleft()
+    if entry is self._bulk[-1]:
+      self._bulk.pop()
+    else:
+      entry[1] = None
+    self._num_bulk -= 1
+    self.num_dropped += 1
+    if entry is self._latest_state:
+      self._latest_state = None
+
+  # forgets the states at the front that were handed out or dropped
+  def _prune_states(self) -> None:
+    while self._states and self._states[0][1] is None:
+      self._states.popleft()
+
+  def _clear_bulk(self) -> None:
+    self.num_dropped += self._num_bulk
+    self._bulk.clear()
+    self._states.clear()
+    self._num_bulk = 0
+    self._latest_state = None
+
+
+# a displayer's queue, it holds at most one CurrentState per round (the newest) and never drops a
+# GameOver or RoundOver. past CAPACITY requests it drops its oldest states, so a slow or disconnected
+# displayer only grows by a round or game over per round
+class Mailbox(LaneQueue):
+  CAPACITY = 64
+
+  def __init__(self, capacity: int = CAPACITY):
+    super().__init__(control_types=(), capacity=capacity)
+
+
+# lets the threaded components put into the async manager's queue
+class LoopQueue:
+  def __init__(self, loop: asyncio.AbstractEventLoop):
+    self._loop = loop
+    self._queue: asyncio.Queue[tuple[float, Request]] = asyncio.Queue()
+
+    # when the last request we handed out was enqueued, for measuring latency
+    self.last_enqueue_time = 0.0
+
+  def put(self, request: Request) -> None:
+    entry = (time.monotonic(), request)
+
+    # handlers running on the loop can skip the hop through call_soon_threadsafe
+    try:
+      on_loop = asyncio.get_running_loop() is self._loop
+    except RuntimeError:
+      on_loop = False
+
+    if on_loop:
+      self._queue.put_nowait(entry)
+    else:
+      self._loop.call_soon_threadsafe(self._queue.put_nowait, entry)
+
+  async def get(self) -> Request:
+    self.last_enqueue_time, request = await self._queue.get()
+    return request
+
+  def get_nowait(self) -> Request:
+    self.last_enqueue_time, request = self._queue.get_nowait()
+    return request
+
+  def empty(self) -> bool:
+    return self._queue.empty()
@@ -7,15 +7,25 @@ from __future__ import annotations
 
 from typing import Collection, Optional
 
+from uno import tracing
+
 # only import what we need if we are doing type checking
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
   from uno.uno import DisplayUNOState
   from uno.player import Player
   from uno.card import Card, Color
+  from uno.deck import Deck
 
 class Request:
-  pass
+  # which table the request belongs to, stamped by that table's manager
+  table_id: int = 0
+
+  # every request is traced from the moment it is made (see uno/tracing.py)
+  def __new__(cls, *args, **kwargs):
+    request = super().__new__(cls)
+    tracing.begin(request)
+    return request
 
 ############################ Requests to State ############################
 
@@ -29,9 +39,11 @@ class PlayCard(Request):
     return f'PlayCard[card={self.card}{"" if not self.for_drawn_card else f", for_drawn_card=True"}]'
 
 class DealtCard(Request):
-  def __init__(self, card: Card, player: Player):
+  # num_recycled is how many cards off the bottom of the discard pile the dealer turned over into its deck
+  def __init__(self, card: Card, player: Player, num_recycled: int = 0):
     self.card = card
     self.player = player
+    self.num_recycled = num_recycled
 
   def __repr__(self) -> str:
     return f'DealtCard[card={self.card}, player={self.player.name}]' if self.player is not None else f'DealtCard[card={self.card}, player=TOP_CARD]'
@@ -89,8 +101,16 @@ class GoNextPlayer(Request):
     return f'GoNextPlayer[dir={self.dir}]'
 
 class DealCard(Request):
-  def __init__(self, player: Player) -> None:
+  # the discard pile is passed along so a simulated dealer can reshuffle it when the deck runs out. the dealer
+  # only reads it (the state is waiting on this deal, so it doesn't change), and the state only takes the
+  # cards out of its pile once the dealer says it used them
+  def __init__(self, player: Player, discard_pile: Optional[Deck] = None) -> None:
     self.player = player
+    self.discard_pile = discard_pile
+
+  # a copy of everything but the top card of the discard pile, only made by a dealer that ran out
+  def recyclable(self) -> list[Card]:
+    return self.discard_pile.cards[:-1] if self.discard_pile is not None else []
 
   def __repr__(self) -> str:
     return f'DealCard[player={self.player.name}]' if self.player is not None else f'DealCard[TOP_CARD]'
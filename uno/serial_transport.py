@@ -0,0 +1,158 @@
+'''
+Talks to the motor driver (motor_driver/motor_driver.ino) over serial without polling.
+
+The board answers every command with exactly one line ("t" if a card went past the
+sensor, "f" otherwise), in the order the commands were sent. So every command gets a
+future, and a reader thread that blocks on the port resolves the oldest one with each
+line that comes in. Several commands can be in flight, the board just works through them.
+
+The board starts a command once it is done with the ones before it, so a command's timeout
+only starts counting once it is the oldest one waiting. If that runs out the board is wedged
+or we lost track of it, and a late answer would be taken as the answer to the next command,
+so everything waiting fails with a TimeoutError. Since every answer looks alike ("t" or "f")
+there is no probe that tells a late answer from a new one, so instead new commands are held
+back until the line has been quiet for RESYNC_QUIET, and anything read until then is thrown
+away. An answer that comes in even later than that still gets mixed up.
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from typing import Optional
+from collections import deque
+from concurrent.futures import Future
+from threading import Thread, Lock, Event
+import time
+
+
+class SerialTransport:
+  # how long the reader blocks on the port before it checks on timeouts
+  READ_TIMEOUT = 0.1
+  # how long the line has to stay quiet after a timeout before new commands are sent,
+  # longer than a deal takes the board (about 1.7 s)
+  RESYNC_QUIET = 3.0
+
+  def __init__(self, port: str, baudrate: int = 9600, timeout: Optional[float] = 30.0):
+    import serial
+
+    self.port = port
+    # default seconds a command has to be answered in, None waits forever
+    self.timeout = timeout
+    self.ser = serial.Serial(port, baudrate, timeout=SerialTransport.READ_TIMEOUT)
+
+    # [future, timeout, deadline] of every command waiting on an answer, oldest first.
+    # only the oldest one has a deadline, the board hasn't started on the rest
+    self._pending: deque[list] = deque()
+    self._lock = Lock()
+    self._closed = Event()
+    # what the reader has read past the last full line
+    self._buffer = b''
+    # after a timeout, when the line counts as quiet if nothing else comes in (None once it has)
+    self._resync_until: Optional[float] = None
+    # commands sent while resyncing, written once the line is quiet
+    self._held: deque[str] = deque()
+
+    self.num_sent = 0
+    # how many times we gave up on the board and started over
+    self.num_timeouts = 0
+
+    self._reader_thread = Thread(target=self._reader, name=f'SerialTransport {port}', daemon=True)
+    self._reader_thread.start()
+
+  # sends the command, the future is resolved with the line the board answers with (timeout defaults to the transport's)
+  def send(self, command: str, timeout: Optional[float] = None) -> Future[str]:
+    timeout = timeout if timeout is not None else self.timeout
+    future: Future[str] = Future()
+    future.set_running_or_notify_cancel()
+
+    # the write and the append have to happen in the same order for every command
+    with self._lock:
+      if self._closed.is_set():
+        raise RuntimeError(f'{self.port} is closed')
+      self._pending.append([future, timeout, None])
+      if self._resync_until is not None:
+        self._held.append(command)
+        return future
+      if len(self._pending) == 1:
+        self._start_deadline()
+      self._write(command)
+    return future
+
+  # sends the command and waits for the answer
+  def request(self, command: str, timeout: Optional[float] = None) -> str:
+    return self.send(command, timeout).result()
+
+  @property
+  def num_in_flight(self) -> int:
+    with self._lock:
+      return len(self._pending)
+
+  def close(self) -> None:
+    self._closed.set()
+    self._reader_thread.join()
+    with self._lock:
+      while self._pending:
+        self._pending.popleft()[0].set_exception(RuntimeError(f'{self.port} was closed'))
+    self.ser.close()
+
+  def _reader(self) -> None:
+    while not self._closed.is_set():
+      # blocks until there is something to read or the read timeout passes
+      data = self.ser.read(self.ser.in_waiting or 1)
+      if self._resync_until is not None:
+        self._resync(data)
+        continue
+      self._buffer += data
+      while b'\n' in self._buffer:
+        line, self._buffer = self._buffer.split(b'\n', 1)
+        self._resolve(line.decode('ascii', errors='replace').strip())
+      self._expire()
+
+  def _resolve(self, line: str) -> None:
+    with self._lock:
+      if not self._pending:
+        # e.g. the board complaining about the motor shield when it boots
+        print(f'WARNING: Unexpected line from {self.port}: {line}')
+        return
+      future = self._pending.popleft()[0]
+      if self._pending:
+        self._start_deadline()
+    future.set_result(line)
+
+  def _expire(self) -> None:
+    with self._lock:
+      if not self._pending or self._pending[0][2] is None or self._pending[0][2] > time.monotonic():
+        return
+      expired = [entry[0] for entry in self._pending]
+      self._pending.clear()
+      self.num_timeouts += 1
+      # anything that comes in now is an answer to a command we already gave up on
+      self.ser.reset_input_buffer()
+      self._buffer = b''
+      self._resync_until = time.monotonic() + SerialTransport.RESYNC_QUIET
+    print(f'WARNING: No answer from {self.port}, failing {len(expired)} commands')
+    for future in expired:
+      future.set_exception(TimeoutError(f'No answer from {self.port}'))
+
+  # throws away what the board still sends after a timeout, the held commands go out once it stops
+  def _resync(self, data: bytes) -> None:
+    with self._lock:
+      if data:
+        self._resync_until = time.monotonic() + SerialTransport.RESYNC_QUIET
+        return
+      if self._resync_until > time.monotonic():
+        return
+      self._resync_until = None
+      if self._pending:
+        self._start_deadline()
+      while self._held:
+        self._write(self._held.popleft())
+
+  def _write(self, command: str) -> None:
+    self.ser.write(f'{command}\n'.encode('ascii'))
+    self.num_sent += 1
+
+  # the oldest command is the one the board is working on, its time starts now
+  def _start_deadline(self) -> None:
+    head = self._pending[0]
+    head[2] = time.monotonic() + head[1] if head[1] is not None else None
@@ -0,0 +1,64 @@
+'''
+Hosts many tables (independent games) in one process.
+
+Every table is an AsyncManager with its own state, controller and displayers, but they all run
+on one event loop, their displayers are called on one shared pool of threads, and the website
+displayers of every table share one socket.io connection (see WebsiteConnection), so adding a
+table adds no threads besides its controller's. Requests are stamped with their table's id, and the website keeps a
+room per table.
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from typing import Optional, Collection
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
+
+from uno.controller import Controller
+from uno.displayer import Displayer
+from uno.manager import AsyncManager
+
+
+class TableRegistry:
+  # threads the displayers of every table share, each one can be stuck on a slow displayer
+  DISPLAYER_WORKERS = 4
+
+  def __init__(self, logger: logging.Logger, url: str, update_window: Optional[float] = 0.016, event_log_dir: Optional[str] = None,
+               displayer_workers: int = DISPLAYER_WORKERS):
+    self.logger = logger
+    self.url = url
+    self.update_window = update_window
+    self.event_log_dir = event_log_dir
+
+    self.loop = asyncio.new_event_loop()
+    self.displayer_executor = ThreadPoolExecutor(max_workers=displayer_workers, thread_name_prefix='TableRegistry displayers')
+    self.tables: dict[int, AsyncManager] = {}
+    self._running = False
+
+    # the loop only keeps weak references to tasks
+    self._tasks: list[asyncio.Task] = []
+
+  def add_table(self, controller_type: type[Controller], displayer_types: Collection[type[Displayer]],
+                seed: Optional[int] = None, script_path: Optional[str] = None) -> int:
+    table_id = len(self.tables)
+    table = AsyncManager(controller_type, displayer_types, self.logger, self.url, self.update_window, self.event_log_dir,
+                         seed, script_path, table_id, self.loop, self.displayer_executor)
+    self.tables[table_id] = table
+    self.logger.info(f'Added table {table_id}')
+
+    # tables can be added while the others are playing
+    if self._running:
+      self.loop.call_soon_threadsafe(self._start_table, table)
+    return table_id
+
+  def start(self):
+    self._running = True
+    for table in self.tables.values():
+      self._start_table(table)
+    self.loop.run_forever()
+
+  def _start_table(self, table: AsyncManager) -> None:
+    table.start_controller()
+    self._tasks.append(self.loop.create_task(table.run()))
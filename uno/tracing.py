@@ -0,0 +1,165 @@
+'''
+Traces requests through the manager pipeline, so we can tell where the time between
+pressing a button and the board changing goes.
+
+Every request gets a trace id and a creation time when it is made. A request made while
+another one is being handled on the same thread joins that request's trace, so the DealCard,
+DealtCard and CurrentStates that a PlayCard causes all share its trace id and start time.
+Whatever a person does after being asked for input starts a new trace, so their thinking
+time isn't counted.
+
+Components call hop() when they take a request off their queue. Each hop records two latencies:
+ * how long since the request was made, keyed by request type and stage (CurrentState @ manager)
+ * how long since its trace started, keyed by the type that started it and stage (PlayCard -> displayer:WebsiteDisplayer)
+'''
+
+# enables lazy type annotation resolving
+from __future__ import annotations
+
+from typing import Optional
+from itertools import count
+from threading import Lock, local
+import math
+import time
+
+# only import what we need if we are doing type checking
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+  from uno.requests import Request
+
+# requests that wait on a person, anything done after them starts a new trace
+WAITS_ON_PERSON = ['GetUserInput']
+
+_trace_ids = count(1)
+
+# the request each thread is currently handling
+_current = local()
+
+
+# fixed log spaced buckets, so recording is cheap and memory doesn't grow with the number of requests
+class LatencyHistogram:
+  # buckets go from 10 us up to ~100 s, each about 19% wider than the last
+  MIN_LATENCY = 1e-5
+  BUCKETS_PER_DOUBLING = 4
+  NUM_BUCKETS = 94
+
+  def __init__(self):
+    self.buckets = [0] * (LatencyHistogram.NUM_BUCKETS + 1)
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+
+  def record(self, latency: float) -> None:
+    if latency <= LatencyHistogram.MIN_LATENCY:
+      idx = 0
+    else:
+      idx = min(math.ceil(math.log2(latency / LatencyHistogram.MIN_LATENCY) * LatencyHistogram.BUCKETS_PER_DOUBLING),
+                LatencyHistogram.NUM_BUCKETS)
+    self.buckets[idx] += 1
+    self.count += 1
+    self.total += latency
+    self.max = max(self.max, latency)
+
+  # upper bound of the bucket the percentile falls in
+  def percentile(self, p: float) -> float:
+    if self.count == 0:
+      return 0.0
+    rank = math.ceil(self.count * p / 100)
+    seen = 0
+    for idx, num in enumerate(self.buckets):
+      seen += num
+      if seen >= rank:
+        return min(LatencyHistogram.MIN_LATENCY * 2 ** (idx / LatencyHistogram.BUCKETS_PER_DOUBLING), self.max)
+    return self.max
+
+  def to_json(self) -> dict:
+    return {
+      'count': self.count,
+      'mean_ms': self.total / max(self.count, 1) * 1000,
+      'p50_ms': self.percentile(50) * 1000,
+      'p95_ms': self.percentile(95) * 1000,
+      'p99_ms': self.percentile(99) * 1000,
+      'max_ms': self.max * 1000,
+    }
+
+
+class TraceRecorder:
+  def __init__(self):
+    # (request type, stage) -> time since the request was made
+    self.hop_latencies: dict[tuple[str, str], LatencyHistogram] = {}
+    # (type that started the trace, stage) -> time since the trace started
+    self.trace_latencies: dict[tuple[str, str], LatencyHistogram] = {}
+
+    # every component's thread records here
+    self._lock = Lock()
+
+  def record(self, request_type: str, root_type: str, stage: str, hop_latency: float, trace_latency: float) -> None:
+    with self._lock:
+      if (histogram := self.hop_latencies.get((request_type, stage))) is None:
+        histogram = self.hop_latencies[(request_type, stage)] = LatencyHistogram()
+      histogram.record(hop_latency)
+
+      if (histogram := self.trace_latencies.get((root_type, stage))) is None:
+        histogram = self.trace_latencies[(root_type, stage)] = LatencyHistogram()
+      histogram.record(trace_latency)
+
+  def clear(self) -> None:
+    with self._lock:
+      self.hop_latencies.clear()
+      self.trace_latencies.clear()
+
+  def summary(self) -> dict[str, dict[str, dict]]:
+    with self._lock:
+      return {
+        'hops': {f'{request_type} @ {stage}': histogram.to_json() for (request_type, stage), histogram in sorted(self.hop_latencies.items())},
+        'traces': {f'{root_type} -> {stage}': histogram.to_json() for (root_type, stage), histogram in sorted(self.trace_latencies.items())},
+      }
+
+  def report(self) -> str:
+    lines = []
+    for section, histograms in self.summary().items():
+      lines.append(f'{section:<48} {"count":>7} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"max ms":>9}')
+      for name, stats in histograms.items():
+        lines.append(f'{name:<48} {stats["count"]:>7} {stats["p50_ms"]:>9.2f} {stats["p95_ms"]:>9.2f} {stats["p99_ms"]:>9.2f} {stats["max_ms"]:>9.2f}')
+    return '\n'.join(lines)
+
+
+# shared by every manager in the process
+RECORDER = TraceRecorder()
+
+
+# called for every new request, see Request.__new__
+def begin(request: Request) -> None:
+  now = time.perf_counter()
+  request.created_at = now
+  request.hops = []
+
+  parent: Optional[Request] = getattr(_current, 'request', None)
+  if parent is not None:
+    request.trace_id = parent.trace_id
+    request.trace_root = parent.trace_root
+    request.trace_start = parent.trace_start
+  else:
+    request.trace_id = next(_trace_ids)
+    request.trace_root = type(request).__name__
+    request.trace_start = now
+
+# moves the start of a trace back, for requests that took work to make (like classifying a card)
+def started_at(request: Request, start_time: float) -> None:
+  request.created_at = start_time
+  if request.trace_root == type(request).__name__:
+    request.trace_start = start_time
+
+# a component took the request off its queue, and is about to handle it on this thread
+def hop(request: Request, stage: str) -> None:
+  now = time.perf_counter()
+  request.hops.append((stage, now))
+  RECORDER.record(type(request).__name__, request.trace_root, stage, now - request.created_at, now - request.trace_start)
+
+  _current.request = request if type(request).__name__ not in WAITS_ON_PERSON else None
+
+def summary() -> dict[str, dict[str, dict]]:
+  return RECORDER.summary()
+
+def report() -> str:
+  return RECORDER.report()
@@ -6,7 +6,7 @@ References:
 # enables lazy type annotation resolving
 from __future__ import annotations
 
-from typing import Collection, Optional
+from typing import Callable, Collection, Optional, Generator
 from queue import Queue # used for golang-style channels
 from threading import Thread
 from enum import Enum
@@ -19,20 +19,24 @@ from uno.card import Color
 from uno.card import Card, Wild, PlusFour
 from uno.player import Player
 from uno.requests import *
+from uno import tracing
+from uno import profiling
 import uno.utils
 
-import copy
 
-# constructs a display state by copying an uno state into json-able object
+# constructs a display state from immutable snapshots of an uno state, unchanged players are shared between display states
 class DisplayUNOState:
+  # how many cards of the discard pile a display state carries
+  DISCARD_HISTORY = 10
+
   def __init__(self, state: UNO):
     self.hand_size = state.hand_size
     self.num_players = state.num_players
-    self.discard_pile = copy.deepcopy(state.discard_pile)
-    self.color = copy.deepcopy(state.color)
+    self.discard_pile = state.discard_pile.snapshot(DisplayUNOState.DISCARD_HISTORY)
+    self.color = state.color
     self.turn = state.turn
     self.dir = state.dir 
-    self.players = copy.deepcopy(state.players)
+    self.players = tuple(player.snapshot() for player in state.players)
 
   def to_json(self) -> str:
     obj = {
@@ -49,26 +53,28 @@ class DisplayUNOState:
 class UNO:
 
   def __init__(self, input_queue: Queue[Request], output_queue: Queue[Request]):
-    self._input_queue = input_queue # requests coming in from the manager or internally
+    self._input_queue = input_queue # requests coming in from the manager
     self._output_queue = output_queue # requests going out to the manager 
-    self._internal_queue = Queue() # this queue is for passing messages in between card threads and the main thread
-    self._main_loop_thread = Thread(target=self._main_loop, daemon=True)
+    self._main_loop_thread = Thread(target=self._main_loop, name='UNO', daemon=True)
+
+    # the sequence of actions in progress, it's suspended whenever it waits on a request (see transaction_sync)
+    self._sequence: Optional[Generator[None, Request, None]] = None
 
-    # this thread is basically a sequence runner 
-    self._sequence_thread: Optional[Thread] = None
+    # called with the state and the request after every request, on whichever thread handles it (see EventLog.handled)
+    self.on_handled: Optional[Callable[[UNO, Request], None]] = None
 
   def start(self):
     self._main_loop_thread.start()
     
+  # the reset is handled by the main loop, so it never races with a running sequence
   def reset(self, request: Request):
-    # check to see if there is a lingering card player thread
-    if self._sequence_thread is not None:
-      self._internal_queue.put(request)
-      self._sequence_thread.join()
+    self._input_queue.put(request)
 
-    # clear the input queue
-    while not self._internal_queue.empty():
-      self._internal_queue.get()
+  def _reset(self, request: Request):
+    # drop whatever sequence was waiting on the old game
+    if self._sequence is not None:
+      self._sequence.close()
+      self._sequence = None
 
     self.discard_pile: Deck = Deck(0)
     self.color: Optional[Color] = None # this is extra info for when the top card is wild or plus4
@@ -93,79 +99,132 @@ class UNO:
       for player in self.players:
         player.clear_hand()
 
-    self._sequence_thread = Thread(target=self.run_init_phase, daemon=True)
-
     # handle the sequence of actions to init the game
-    self._sequence_thread.start()
+    self._start_sequence(self.run_init_phase())
 
   def _main_loop(self):
+    # lets the profiler see which sequence we are waiting in
+    profiling.track_suspended(self, lambda: self._sequence)
     while True:
       request = self._input_queue.get()
+      tracing.hop(request, 'uno')
+      self.handle_request(request)
 
-      if type(request) is CorrectedState:
-        self.handle_state_correction(request.state_update)
-      elif type(request) in [PlayCard, CallUNO, SkipTurn] and request.for_drawn_card:
-        # just forward along to skip turn handler if we're drawing a card
-        if request.for_drawn_card:
-          self._internal_queue.put(request)
-          continue
-      elif type(request) in [PlayCard, CallUNO]:
-
-        # reap the thread 
-        if self._sequence_thread: self._sequence_thread.join() 
-        
-        card = request.card
-        # check to see if we can play this card
-        curr_player: Player = self.players[self.turn]
-        if card not in curr_player.get_playable_cards(self.discard_pile.peek(), self.color):
-          print('Unplayable card')
-          request_list = [PlayCard, SkipTurn]
-
-          if self.uno_fail_player is not None: request_list.append(UNOFail)
-          if self.call_uno_player is not None: request_list.append(CallUNO)
-
-          self._output_queue.put(GetUserInput(request_list, for_invalid_card=True))
-          continue
-
-        self.uno_fail_player = None
-        if type(request) is CallUNO:
-          self.call_uno_player = None
-          
-
-        # pop this card off the players hand
-        curr_player.remove_card(card, self)
+  # nothing is waiting on a request, so the fields below are the whole state
+  def is_quiescent(self) -> bool:
+    return self._sequence is None
 
+  def save_state(self) -> dict:
+    assert self.is_quiescent()
+    return {
+      'hand_size': self.hand_size,
+      'num_players': self.num_players,
+      'end_score': self.end_score,
+      'discard_pile': list(self.discard_pile.cards),
+      'color': self.color,
+      'turn': self.turn,
+      'dir': self.dir,
+      'call_uno_player': self.call_uno_player,
+      'uno_fail_player': self.uno_fail_player,
+      'players': [(list(player.hand), player.drawn_card, player.name, player.score) for player in self.players],
+    }
 
-        self._sequence_thread = Thread(target=card.play_card, args=(self,), daemon=True)
-
-        # handle the sequence of actions caused by this card
-        self._sequence_thread.start()
-      elif type(request) is UNOFail:
-        # punish this player
-        if self._sequence_thread: self._sequence_thread.join()
-
-        self._sequence_thread = Thread(target=self.run_uno_fail, daemon=True)
+  def load_state(self, saved: dict) -> None:
+    if self._sequence is not None:
+      self._sequence.close()
+      self._sequence = None
+
+    self.hand_size = saved['hand_size']
+    self.num_players = saved['num_players']
+    self.end_score = saved['end_score']
+    self.discard_pile = Deck(0)
+    self.discard_pile.cards = list(saved['discard_pile'])
+    self.color = saved['color']
+    self.turn = saved['turn']
+    self.dir = saved['dir']
+    self.call_uno_player = saved['call_uno_player']
+    self.uno_fail_player = saved['uno_fail_player']
+
+    self.players = []
+    for pos, (hand, drawn_card, name, score) in enumerate(saved['players']):
+      player = Player(hand, pos, name)
+      player.drawn_card = drawn_card
+      player.score = score
+      self.players.append(player)
+
+  def handle_request(self, request: Request) -> None:
+    self._handle_request(request)
+    if self.on_handled is not None:
+      self.on_handled(self, request)
+
+  def _handle_request(self, request: Request) -> None:
+    if type(request) in [Reset, RoundReset]:
+      self._reset(request)
+    elif type(request) is CorrectedState:
+      self.handle_state_correction(request.state_update)
+    elif type(request) in [PlayCard, CallUNO, SkipTurn] and request.for_drawn_card:
+      # just forward along to skip turn handler if we're drawing a card
+      self._resume_sequence(request)
+    elif self._sequence is not None and type(request) in [PlayCard, CallUNO, UNOFail, SkipTurn]:
+      print(f'Ignoring {request}, still waiting on the current sequence')
+    elif type(request) in [PlayCard, CallUNO]:
+      card = request.card
+      # check to see if we can play this card
+      curr_player: Player = self.players[self.turn]
+      if not curr_player.can_play_card(card, self.discard_pile.peek(), self.color):
+        print('Unplayable card')
+        request_list = [PlayCard, SkipTurn]
+
+        if self.uno_fail_player is not None: request_list.append(UNOFail)
+        if self.call_uno_player is not None: request_list.append(CallUNO)
+
+        self._output_queue.put(GetUserInput(request_list, for_invalid_card=True))
+        return
+
+      self.uno_fail_player = None
+      if type(request) is CallUNO:
+        self.call_uno_player = None
+        
 
-        self._sequence_thread.start()
+      # pop this card off the players hand
+      curr_player.remove_card(card, self)
 
-      elif type(request) is SkipTurn:
-        if self._sequence_thread: self._sequence_thread.join() 
+      # handle the sequence of actions caused by this card
+      self._start_sequence(self.run_play_card(card))
+    elif type(request) is UNOFail:
+      # punish this player
+      self._start_sequence(self.run_uno_fail())
 
-        self.uno_fail_player = None
+    elif type(request) is SkipTurn:
+      self.uno_fail_player = None
 
-        if len(self.players[self.turn].hand) == 1:
-          self.call_uno_player = self.turn
-        else:
-          self.call_uno_player = None
+      if len(self.players[self.turn].hand) == 1:
+        self.call_uno_player = self.turn
+      else:
+        self.call_uno_player = None
 
-        self._sequence_thread = Thread(target=self.run_skip_turn, daemon=True)
+      # handle the sequence of actions caused skipping
+      self._start_sequence(self.run_skip_turn())
+    
+    else:
+      # forward along to the waiting sequence
+      self._resume_sequence(request)
+
+  # runs a sequence up to the first request it waits on
+  def _start_sequence(self, sequence: Generator[None, Request, None]) -> None:
+    self._sequence = sequence
+    self._resume_sequence(None)
+
+  # hands the request to the waiting sequence and runs it up to the next request it waits on
+  def _resume_sequence(self, request: Optional[Request]) -> None:
+    if self._sequence is None:
+      print(f'Unexpected {request}, nothing is waiting on it')
+      return
 
-        # handle the sequence of actions caused skipping
-        self._sequence_thread.start()
-      
-      else:
-        # forward along to card handler
-        self._internal_queue.put(request)
+    try:
+      self._sequence.send(request)
+    except StopIteration:
+      self._sequence = None
 
   def handle_state_correction(self, state_correction):
 
@@ -181,8 +240,7 @@ class UNO:
     else:
       position = int(position)
       card_idx = int(card_idx)
-      self.players[position].hand[card_idx] = new_card
-      self.players[position]._sort_hand() 
+      self.players[position].replace_card(card_idx, new_card)
 
     # send back the updated state
     self._send_update_to_displayer()
@@ -192,24 +250,31 @@ class UNO:
       curr_player: Player = self.players[pos]
       # deal all the cards to this player
       for _ in range(self.hand_size):
-        if (received_request := self.transaction_sync(DealCard(curr_player))) is None: return
+        received_request = yield from self.transaction_sync(DealCard(curr_player, self.discard_pile))
         curr_player.receive_card(received_request.card, self)
         
       self.go_next_player(is_turn_end=False)
 
     # get the initial card
     while True:
-      if (received_request := self.transaction_sync(DealCard(player=None))) is None: return
+      received_request = yield from self.transaction_sync(DealCard(None, self.discard_pile))
       if type(received_request.card) not in [Wild, PlusFour]:
         break
+      # wild cards stay on the table under the real initial card
+      self.discard_pile.push(received_request.card)
     
-    received_request.card.play_card(self)
+    yield from self.run_play_card(received_request.card)
+
+  # cards that wait on the controller give back a sequence, the rest are done right away
+  def run_play_card(self, card: Card):
+    if (sequence := card.play_card(self)) is not None:
+      yield from sequence
 
   # handles the full sequence of a player asking to draw a card 
   def run_skip_turn(self):
     # deal card to the player
     curr_player: Player = self.players[self.turn]
-    if (received_request := self.transaction_sync(DealCard(curr_player))) is None: return
+    received_request = yield from self.transaction_sync(DealCard(curr_player, self.discard_pile))
 
     received_card = received_request.card
 
@@ -230,7 +295,7 @@ class UNO:
 
       for_invalid_card = False
       while True:
-        if (received_request := self.transaction_sync(GetUserInput(request_list, for_drawn_card=True, for_invalid_card=for_invalid_card))) is None: return
+        received_request = yield from self.transaction_sync(GetUserInput(request_list, for_drawn_card=True, for_invalid_card=for_invalid_card))
         if type(received_request) is SkipTurn:
           # add the card to their hand 
           curr_player.receive_card(received_card, self)
@@ -245,7 +310,7 @@ class UNO:
           # reset drawn card
           curr_player.drawn_card = None
           # play the card
-          received_card.play_card(self)
+          yield from self.run_play_card(received_card)
           break
         print('Trying to play non-drawn card')
         for_invalid_card = True
@@ -272,7 +337,7 @@ class UNO:
     # punish player with 4 cards
     curr_player: Player = self.players[self.turn]
     for _ in range(4):
-      if (received_request := self.transaction_sync(DealCard(curr_player))) is None: return
+      received_request = yield from self.transaction_sync(DealCard(curr_player, self.discard_pile))
       curr_player.receive_card(received_request.card, self)
     
     for _ in range(count):
@@ -283,18 +348,31 @@ class UNO:
     if self.call_uno_player is not None:
       request_list.append(CallUNO)
 
-    self._output_queue.put(GetUserInput(request_list))
-
+    # update the displayer before waiting on the player
     self._send_update_to_displayer()
+
+    self._output_queue.put(GetUserInput(request_list))
     
 
-  # performs a synchronous transaction 
-  def transaction_sync(self, request: Request) -> Optional[Request]:
+  # performs a synchronous transaction, used with yield from inside a sequence
+  def transaction_sync(self, request: Request) -> Generator[None, Request, Request]:
     # send out the request
     self._output_queue.put(request)
-    # wait on the internal queue for card-related requests (or reset)
-    received_request = self._internal_queue.get()
-    return None if type(received_request) is Reset else received_request
+    # the main loop resumes us with the reply, a reset closes the sequence here instead
+    received_request = yield
+    while not UNO._is_reply(request, received_request):
+      print(f'Unexpected {received_request} while waiting on {request}')
+      received_request = yield
+    if type(received_request) is DealtCard and received_request.num_recycled:
+      # the dealer turned the bottom of our discard pile over into its deck
+      del self.discard_pile.cards[:received_request.num_recycled]
+    return received_request
+
+  @staticmethod
+  def _is_reply(request: Request, received_request: Request) -> bool:
+    if type(request) is DealCard:
+      return type(received_request) is DealtCard
+    return type(received_request) in request.request_types
 
 
   def go_next_player(self, is_turn_end: bool = True) -> None:
@@ -318,10 +396,10 @@ class UNO:
 
       # game over
       if game_winner is not None:
-        self._output_queue.put(GameOver(copy.deepcopy(game_winner)))
+        self._output_queue.put(GameOver(game_winner.snapshot()))
       # round over
       else:
-        self._output_queue.put(RoundOver(copy.deepcopy(round_winner)))
+        self._output_queue.put(RoundOver(round_winner.snapshot()))
       return
     
     # handle normal turn over things
@@ -337,11 +415,11 @@ class UNO:
       self.call_uno_player = self.turn
       request_list.append(CallUNO)
 
-    self._output_queue.put(GetUserInput(request_list))
-
-    # update the displayer
+    # update the displayer before waiting on the player
     self._send_update_to_displayer()
 
+    self._output_queue.put(GetUserInput(request_list))
+
   def go_prev_player(self) -> None:
     self._output_queue.put(GoNextPlayer(-self.dir, self.num_players))
     self.turn = (self.turn - self.dir) % self.num_players
@@ -361,7 +439,7 @@ class UNO:
   
   def get_round_winner(self) -> Optional[Player]:
     for player in self.players:
-      if player.hand == [ ]:
+      if not player.hand:
         return player
     return None
 
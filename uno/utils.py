@@ -1,5 +1,5 @@
 from uno.card import Card, Wild, PlusFour, PlusTwo, Skip, Reverse, Number
-from uno.card import Color
+from uno.card import Color, CARDS
 
 def card_from_string(color: str, card_type: str) -> Card:
   card_types = [PlusTwo, Skip, Reverse]
@@ -35,4 +35,7 @@ def card_from_classification(card_label: int, color_label: int) -> Card:
   elif card_label == 13:
     return Wild()
   else:
-    return PlusFour()
\ No newline at end of file
+    return PlusFour()
+
+def card_from_id(card_id: int) -> Card:
+  return CARDS[card_id]
@@ -1,16 +1,51 @@
 from flask import request
-from flask_socketio import emit
+from flask_socketio import emit, join_room
 import os
 import base64
 
 from .extensions import socketio
 
-most_recent_state = None
+# the most recent state of every table, by table id
+most_recent_states = {}
+
+# the table each website connection is watching
+sid_tables = {}
+
+def table_room(table_id):
+    return f'table_{table_id}'
+
+# applies a delta from the pi (see uno/delta.py) to the most recent state in place
+def apply_delta(state, ops):
+    for op in ops:
+        kind = op['op']
+        if kind == 'hand_remove':
+            del state['players'][op['player']]['hand'][op['index']]
+        elif kind == 'hand_add':
+            state['players'][op['player']]['hand'].insert(op['index'], op['card'])
+        elif kind == 'player':
+            player = state['players'][op['player']]
+            for field in ['drawn_card', 'name', 'score']:
+                if field in op:
+                    player[field] = op[field]
+        elif kind == 'top_card':
+            cards = state['discard_pile']['cards']
+            cards.append(op['card'])
+            del cards[:-state['discard_history']]
+        elif kind == 'discard_pile':
+            state['discard_pile']['cards'] = op['cards']
+        else:
+            state[kind] = op[kind]
 
 @socketio.on("connect")
 def handle_connect(data):
     print("new connection")
 
+    # websites pick their table with ?table=<id>, the pi doesn't need one
+    sid = request.sid
+    table_id = int(request.args.get('table', 0))
+    sid_tables[sid] = table_id
+    join_room(table_room(table_id))
+
     # send off all the images to the website
     images_path = os.path.join(os.path.dirname(__file__), '../uno/images')
     image_names = os.listdir(images_path)
@@ -27,40 +62,74 @@ def handle_connect(data):
 
       images.append({'image_name': image_name, 'img': encoded_image})
     
-    sid = request.sid
     emit('get_images', images, room=sid)
 
-    if most_recent_state is not None:
+    if most_recent_states.get(table_id) is not None:
         print('sending state!')
-        emit('new_state', most_recent_state)
+        emit('new_state', most_recent_states[table_id], room=sid)
+
+@socketio.on("disconnect")
+def handle_disconnect():
+    sid_tables.pop(request.sid, None)
+
+# requests from a website go to the pi with the table the website is watching
+def website_request(data):
+    data = data if isinstance(data, dict) else {}
+    data['table_id'] = sid_tables.get(request.sid, 0)
+    return data
 
 @socketio.on("website_reset")
 def handle_reset(data):
     print('got website reset')
-    emit("reset", data, broadcast=True)
+    emit("reset", website_request(data), broadcast=True)
 
 @socketio.on("website_round_reset")
 def handle_reset(data):
-    emit("round_reset", broadcast=True)
+    emit("round_reset", website_request(data), broadcast=True)
 
 
 @socketio.on("website_state_correction")
 def handle_state_correction(data):
-    emit("state_correction", data, broadcast=True)
+    emit("state_correction", website_request(data), broadcast=True)
+
+
+@socketio.on("website_resync")
+def handle_resync(data):
+    # a website missed a delta, send it the whole state
+    table_id = sid_tables.get(request.sid, 0)
+    if most_recent_states.get(table_id) is not None:
+        emit('new_state', most_recent_states[table_id], room=request.sid)
 
 
 @socketio.on("pi_state")
 def handle_pi_state(data):
     # receive the state (or something else, like game over)
-    global most_recent_state
-    most_recent_state = data
+    table_id = data.get('table_id', 0)
+    most_recent_states[table_id] = data
        
-    emit("new_state", data, broadcast=True)
+    emit("new_state", data, to=table_room(table_id))
+
+@socketio.on("pi_delta")
+def handle_pi_delta(data):
+    table_id = data.get('table_id', 0)
+    state = most_recent_states.get(table_id)
+
+    # we missed something from the pi, wait for a full state
+    if state is None or data['seq'] != state['seq'] + 1:
+        print(f'missed a state delta for table {table_id}, asking for the full state')
+        most_recent_states[table_id] = None
+        emit("request_full_state", {'table_id': table_id}, broadcast=True)
+        return
+
+    apply_delta(state, data['ops'])
+    state['seq'] = data['seq']
+
+    emit("state_delta", data, to=table_room(table_id))
 
 @socketio.on("pi_game_over")
 def handle_pi_game_over(data):
-    emit("game_over", data, broadcast=True)
+    emit("game_over", data, to=table_room(data.get('table_id', 0)))
 
 @socketio.on("pi_round_over")
 def handle_pi_round_over(data):
-    emit("round_over", data, broadcast=True)
+    emit("round_over", data, to=table_room(data.get('table_id', 0)))
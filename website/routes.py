@@ -12,11 +12,11 @@ def handle_reset():
     print("yipee")
     print(request.form["num_players"])
     print(request.form["num_cards"])
-    emit("reset", {"num_players" : request.form["num_players"], "num_cards" : request.form["num_cards"]}, namespace="/", broadcast=True)
+    emit("reset", {"num_players" : request.form["num_players"], "num_cards" : request.form["num_cards"], "table_id": int(request.args.get("table", 0))}, namespace="/", broadcast=True)
     return redirect("/")
 
 @main.route("/round_reset", methods=['POST'])
 def handle_round_reset():
     print("yipee_round_reset")
-    emit("round_reset", namespace="/", broadcast=True)
+    emit("round_reset", {"table_id": int(request.args.get("table", 0))}, namespace="/", broadcast=True)
     return redirect("/")